@@ -1,18 +1,24 @@
-from random import randrange
+from coin_engine import run_experiments, stream_tosses
+from random_streams import stream
 
-# let's pick a random number between {0,1,...,99}
-# it is expected to be less than 60 with probability 0.6
-#     and greater than or equal to 60 with probability 0.4
-
-for experiment in [100,1000,10000,100000]:
-    heads = tails = 0
-    for i in range(experiment):
-
-        if randrange(100) <60: heads = heads + 1        # with probability 0.6
-        else: tails = tails + 1                         # with probability 0.4
+# each toss is heads with probability 0.6 and tails with probability 0.4
+# (the same as picking a random number between {0,1,...,99} and checking if it is less than 60)
+#
+# the tosses are drawn by the vectorized engine in coin_engine.py,
+#     so the experiment list can grow far beyond what a Python loop allows
 
+for experiment, heads, tails in run_experiments([100,1000,10000,100000,10**6,10**9], p_heads=0.6):
 
     print("experiment:",experiment)
     print("heads =",heads,"  tails = ",tails)
     print("the ratio of #heads/#tails is",(round(heads/tails,4)))
-    print() 
\ No newline at end of file
+    print()
+
+
+# watch the ratio converge to 0.6/0.4 = 1.5 while 10^10 tosses are made,
+#     one snapshot after every 10^9 tosses (the memory used does not grow with the number of tosses)
+# (stream(None, 1) is a random stream independent of the one used by run_experiments above)
+
+for snapshot in stream_tosses(10**10, p_heads=0.6, chunk_size=10**9, rng=stream(None, 1)):
+    print("after",snapshot.tosses,"tosses: heads =",snapshot.heads,"  tails =",snapshot.tails,
+          "  ratio =",round(snapshot.ratio,6))
@@ -1,49 +1,60 @@
-# Define a function that simulates a biased coin flip
+# Estimate the bias of a coin from the ratio of heads
+#
+# The tosses are not made one by one with a biased_coin function returning "Heads"/"Tails":
+# estimate_biases (in bias_estimation.py) samples the number of heads of all tosses at once
 
 
-from random import randrange
+import numpy as np
 
-def biased_coin(N,B):
-    
-    # Generate a random number between 0 and N-1
-    random_number = randrange(N)
-    
-    
-    # Return "Heads" if random number is less than bias B, otherwise return "Tails"
-    if random_number < B:
-        return "Heads"
-    else:
-        return "Tails"
+from bias_estimation import estimate_biases, sequential_estimate
+from random_streams import make_generator, randrange
+
+# set the QBRONZE_SEED environment variable to get the same results on every run
+rng = make_generator()
 
 
 # Set the range for the bias (N = 101, so bias can be 0 to 100)
 N = 101
 
 # Generate a random bias value between 0 and N (inclusive)
-B = randrange(N+1)
+B = int(randrange(rng, N+1))
 
 
 # total number of coin tosses
 total_tosses = 500
 
 
-# counter to track the number of heads observed
-the_number_of_heads = 0
+# Calculate the estimated bias based on observed heads ratio
+# (a toss is "Heads" with probability B/N, as randrange(N) < B)
+real_bias = B/N
+guesses, errors = estimate_biases([real_bias], [total_tosses], rng=rng)
+my_guess = guesses[0, 0]
+error = errors[0, 0]
 
-for i in range(total_tosses):
 
+print("my guess is",my_guess)
+print("real bias is",real_bias)
+print("error (%) is",error)
+print()
 
-    # If the coin flip returns "Heads", increment the heads counter
-    if biased_coin(N,B) == "Heads":
-        the_number_of_heads = the_number_of_heads + 1
 
+# Chart the estimation error against the number of tosses for thousands of biases at once
+all_biases = np.arange(1, N+1) / N
+all_biases = np.repeat(all_biases, 50)          # 50 coins for each bias B/N with B = 1,...,N
+budgets = [10, 100, 500, 1000, 10000, 100000]
 
-# Calculate the estimated bias based on observed heads ratio
-my_guess =  the_number_of_heads/total_tosses   
-real_bias = B/N
-error = abs(my_guess-real_bias)/real_bias*100 
+_, errors = estimate_biases(all_biases, budgets, rng=rng)
 
+for tosses, mean_error in zip(budgets, errors.mean(axis=0)):
+    print("with",tosses,"tosses the average error (%) over",len(all_biases),"coins is",round(mean_error,4))
+print()
 
-print("my guess is",my_guess)
-print("real bias is",real_bias)
-print("error (%) is",error)
\ No newline at end of file
+
+# Stop tossing as soon as the estimate is good enough:
+# every coin is tossed 50 times per round until its 95% confidence interval is at most 0.1 wide
+result = sequential_estimate(all_biases, width=0.1, confidence=0.95, rng=rng)
+
+print("a 0.1 wide interval needed",round(result.tosses.mean(),1),"tosses per coin on average",
+      "(between",result.tosses.min(),"and",result.tosses.max(),"tosses)")
+print("the real bias was inside the interval for",
+      round(np.mean((result.low <= all_biases) & (all_biases <= result.high))*100,2),"% of the coins")
@@ -1,17 +1,10 @@
-from random import randrange
+from coin_engine import run_experiments
 
-for experiment in [100,1000,10000,100000]:
-    
-    heads = tails = 0
+# Perform fair coin flips for each number of tosses in the experiment list
+# (heads and tails both have probability 0.5; the tosses are drawn by coin_engine.py)
+for experiment, heads, tails in run_experiments([100,1000,10000,100000,10**6,10**9], p_heads=0.5):
 
-    # Perform coin flips for the number of times specified by experiment
-    for i in range(experiment):
-        
-        # Generate a random number (0 or 1) to simulate a coin flip
-        if randrange(2) == 0: heads = heads + 1  # Increment heads counter if result is 0
-        else: tails = tails + 1                  # Increment tails counter if result is 1
-    
     print("experiment:",experiment)
     print("heads =",heads,"  tails = ",tails)    
     print("the ratio of #heads/#tails is",(round(heads/tails,4)))
-    print() 
\ No newline at end of file
+    print()
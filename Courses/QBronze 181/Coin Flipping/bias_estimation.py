@@ -0,0 +1,133 @@
+# Vectorized bias estimation for Coin Bias Estimation.py
+#
+# Instead of calling biased_coin once per toss and comparing the returned
+# string with "Heads", the number of heads for every (bias, number of tosses)
+# pair is sampled in one NumPy call and the estimates and errors are returned
+# as matrices.
+#
+# sequential_estimate instead tosses each coin in batches and stops as soon as
+# a confidence interval for its bias is narrow enough.
+
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+from random_streams import make_generator, randrange
+
+# result of sequential_estimate, every field is an array with one entry per coin
+SequentialEstimate = namedtuple("SequentialEstimate", ["estimate", "low", "high", "tosses"])
+
+
+def biased_coin_tosses(N, B, tosses, rng=None):
+    """
+    Vectorized version of biased_coin(N, B): toss the coin `tosses` times and
+    return a boolean array, True meaning "Heads" (probability B/N).
+    """
+    if rng is None:
+        rng = make_generator()
+    return randrange(rng, N, tosses) < B
+
+
+def estimate_biases(biases, budgets, rng=None, relative=True):
+    """
+    Estimate every bias in `biases` with every number of tosses in `budgets`.
+
+    Returns (estimates, errors), two arrays of shape (len(biases), len(budgets)):
+    estimates[i, j] is the ratio of heads seen when the coin with bias
+    biases[i] is tossed budgets[j] times. Every entry uses its own tosses.
+    The errors are |estimate - bias| / bias * 100 (in %) like in the original
+    script, or |estimate - bias| when relative=False. The relative error of
+    a bias of 0 is nan.
+    """
+    biases = np.asarray(biases, dtype=float)
+    budgets = np.asarray(budgets, dtype=np.int64)
+    if biases.ndim != 1 or budgets.ndim != 1:
+        raise ValueError("biases and budgets must be one-dimensional")
+    if np.any((biases < 0) | (biases > 1)):
+        raise ValueError("every bias must be in [0, 1]")
+    if np.any(budgets <= 0):
+        raise ValueError("every number of tosses must be positive")
+    if rng is None:
+        rng = make_generator()
+
+    heads = rng.binomial(budgets[np.newaxis, :], biases[:, np.newaxis])
+    estimates = heads / budgets[np.newaxis, :]
+    errors = np.abs(estimates - biases[:, np.newaxis])
+
+    if relative:
+        real = np.broadcast_to(biases[:, np.newaxis], errors.shape)
+        errors = np.divide(errors, real, out=np.full(errors.shape, np.nan), where=real > 0) * 100
+
+    return estimates, errors
+
+
+def wilson_interval(heads, tosses, confidence=0.95):
+    """
+    Wilson score interval (low, high) for the bias of a coin that showed
+    `heads` heads in `tosses` tosses. Works elementwise on arrays.
+    """
+    heads = np.asarray(heads, dtype=float)
+    tosses = np.asarray(tosses, dtype=float)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    ratio = heads / tosses
+    denominator = 1 + z**2 / tosses
+    center = (ratio + z**2 / (2 * tosses)) / denominator
+    half_width = z * np.sqrt(ratio * (1 - ratio) / tosses + z**2 / (4 * tosses**2)) / denominator
+    return center - half_width, center + half_width
+
+
+def hoeffding_interval(heads, tosses, confidence=0.95):
+    """
+    Two-sided Hoeffding interval (low, high): heads / tosses plus or minus
+    sqrt(ln(2 / alpha) / (2 tosses)) with alpha = 1 - confidence, clipped to
+    [0, 1]. Its width only depends on the number of tosses, so it never stops
+    earlier for skewed coins.
+    """
+    heads = np.asarray(heads, dtype=float)
+    tosses = np.asarray(tosses, dtype=float)
+    ratio = heads / tosses
+    half_width = np.sqrt(np.log(2 / (1 - confidence)) / (2 * tosses))
+    return np.clip(ratio - half_width, 0, 1), np.clip(ratio + half_width, 0, 1)
+
+
+INTERVALS = {"wilson": wilson_interval, "hoeffding": hoeffding_interval}
+
+
+def sequential_estimate(biases, width, confidence=0.95, bound="wilson", batch_size=50,
+                        max_tosses=100_000, rng=None):
+    """
+    Estimate the bias of every coin in `biases`, tossing all unfinished coins
+    `batch_size` more times per round and stopping each coin as soon as its
+    confidence interval is at most `width` wide (or after `max_tosses` tosses).
+
+    `bound` is "wilson" or "hoeffding". Returns a SequentialEstimate whose
+    `tosses` field is the number of tosses each coin consumed.
+    Note that the interval is checked after every batch, so its coverage is
+    somewhat below `confidence`; ask for a higher confidence to compensate.
+    """
+    if bound not in INTERVALS:
+        raise ValueError(f"unknown bound {bound!r}, expected one of {sorted(INTERVALS)}")
+    if not 0 < confidence < 1:
+        raise ValueError(f"confidence must be in (0, 1), got {confidence}")
+    if width <= 0 or batch_size <= 0 or max_tosses <= 0:
+        raise ValueError("width, batch_size and max_tosses must be positive")
+    interval = INTERVALS[bound]
+    biases = np.atleast_1d(np.asarray(biases, dtype=float))
+    if rng is None:
+        rng = make_generator()
+
+    heads = np.zeros(biases.shape, dtype=np.int64)
+    tosses = np.zeros(biases.shape, dtype=np.int64)
+    low = np.zeros(biases.shape)
+    high = np.ones(biases.shape)
+    active = np.ones(biases.shape, dtype=bool)
+
+    while active.any():
+        size = np.minimum(batch_size, max_tosses - tosses[active])
+        heads[active] += rng.binomial(size, biases[active])
+        tosses[active] += size
+        low[active], high[active] = interval(heads[active], tosses[active], confidence)
+        active &= (high - low > width) & (tosses < max_tosses)
+
+    return SequentialEstimate(heads / tosses, low, high, tosses)
@@ -0,0 +1,106 @@
+# Vectorized coin-flip engine shared by the Coin Flipping experiments
+#
+# The original scripts call randrange once per toss inside a Python loop.
+# Here the tosses are drawn with NumPy, either in fixed-size batches or by
+# sampling the number of heads directly from a binomial distribution, so an
+# experiment of 10^9 tosses runs in bounded memory. The generators come from
+# random_streams.py, so every experiment can be reproduced from its seed.
+
+from collections import namedtuple
+
+import numpy as np
+
+from random_streams import bernoulli, make_generator
+
+# maximum number of tosses held in memory at once by the "batch" method
+DEFAULT_BATCH_SIZE = 1_000_000
+
+# running totals reported by stream_tosses after each chunk
+Snapshot = namedtuple("Snapshot", ["tosses", "heads", "tails", "ratio"])
+
+
+def _check_toss_arguments(tosses, p_heads):
+    if tosses < 0:
+        raise ValueError(f"number of tosses must be non-negative, got {tosses}")
+    if not 0 <= p_heads <= 1:
+        raise ValueError(f"probability of heads must be in [0, 1], got {p_heads}")
+
+
+def flip_coins(tosses, p_heads=0.5, rng=None):
+    """
+    Toss a coin `tosses` times and return a boolean array (True means heads).
+    Use this when the individual tosses are needed; it allocates one byte per toss.
+    """
+    _check_toss_arguments(tosses, p_heads)
+    if rng is None:
+        rng = make_generator()
+    return bernoulli(rng, p_heads, tosses)
+
+
+def count_heads(tosses, p_heads=0.5, rng=None, method="binomial", batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Toss a coin `tosses` times and return the pair (heads, tails).
+
+    method="binomial" samples the number of heads directly, which costs the
+    same for 100 tosses as for 10^9 tosses.
+    method="batch" draws the individual tosses in batches of `batch_size`, so
+    memory stays bounded by the batch size whatever the number of tosses.
+    """
+    _check_toss_arguments(tosses, p_heads)
+    if rng is None:
+        rng = make_generator()
+
+    if method == "binomial":
+        heads = int(rng.binomial(tosses, p_heads))
+    elif method == "batch":
+        if batch_size <= 0:
+            raise ValueError(f"batch size must be positive, got {batch_size}")
+        heads = 0
+        remaining = tosses
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            heads += int(np.count_nonzero(bernoulli(rng, p_heads, size)))
+            remaining -= size
+    else:
+        raise ValueError(f"unknown method {method!r}, expected 'binomial' or 'batch'")
+
+    return heads, tosses - heads
+
+
+def run_experiments(experiments, p_heads=0.5, seed=None, method="binomial"):
+    """
+    Run one experiment for each number of tosses in `experiments`.
+    Returns a list of (tosses, heads, tails) tuples, in the same order.
+    """
+    rng = make_generator(seed)
+    results = []
+    for tosses in experiments:
+        heads, tails = count_heads(tosses, p_heads, rng=rng, method=method)
+        results.append((tosses, heads, tails))
+    return results
+
+
+def stream_tosses(tosses, p_heads=0.5, chunk_size=DEFAULT_BATCH_SIZE, rng=None, method="binomial"):
+    """
+    Toss a coin `tosses` times in chunks of `chunk_size` tosses and yield a
+    Snapshot of the running totals after every chunk.
+
+    Memory does not depend on `tosses`, so this can follow the convergence of
+    the #heads/#tails ratio over 10^10 tosses while the run is still going.
+    The ratio is inf while no tails have been seen.
+    """
+    _check_toss_arguments(tosses, p_heads)
+    if chunk_size <= 0:
+        raise ValueError(f"chunk size must be positive, got {chunk_size}")
+    if rng is None:
+        rng = make_generator()
+
+    done = heads = 0
+    while done < tosses:
+        size = min(chunk_size, tosses - done)
+        chunk_heads, _ = count_heads(size, p_heads, rng=rng, method=method)
+        done += size
+        heads += chunk_heads
+        tails = done - heads
+        ratio = heads / tails if tails else float("inf")
+        yield Snapshot(done, heads, tails, ratio)
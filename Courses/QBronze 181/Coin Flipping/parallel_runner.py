@@ -0,0 +1,79 @@
+# Multi-process Monte Carlo runner for the coin experiments
+#
+# An experiment is split into equal parts, one per worker process. Every worker
+# draws its tosses from its own child of a numpy.random.SeedSequence, so the
+# streams are independent and the merged counts are the same on every run
+# with the same seed and the same number of workers.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from coin_engine import count_heads
+from random_streams import seed_sequence
+
+
+def split_tosses(tosses, workers):
+    """
+    Split `tosses` into `workers` parts whose sizes differ by at most one.
+    """
+    if workers <= 0:
+        raise ValueError(f"number of workers must be positive, got {workers}")
+    share, extra = divmod(tosses, workers)
+    return [share + 1 if i < extra else share for i in range(workers)]
+
+
+def _count_part(tosses, p_heads, seed_sequence, method):
+    # runs inside a worker process
+    return count_heads(tosses, p_heads, rng=np.random.default_rng(seed_sequence), method=method)
+
+
+def parallel_count_heads(tosses, p_heads=0.5, seed=None, workers=None, method="batch", executor=None):
+    """
+    Toss a coin `tosses` times across `workers` processes and return (heads, tails).
+
+    The result only depends on (seed, workers): the tosses are split the same
+    way and each part uses the same child stream of SeedSequence(seed) every time.
+    `seed` may also be a SeedSequence (see random_streams.seed_sequence).
+    An existing executor can be passed in to avoid starting a new pool per call.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    parts = split_tosses(tosses, workers)
+    streams = seed_sequence(seed).spawn(workers)
+
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            counts = list(pool.map(_count_part, parts, [p_heads] * workers, streams, [method] * workers))
+    else:
+        counts = list(executor.map(_count_part, parts, [p_heads] * workers, streams, [method] * workers))
+
+    heads = sum(part_heads for part_heads, _ in counts)
+    return heads, tosses - heads
+
+
+def parallel_run_experiments(experiments, p_heads=0.5, seed=None, workers=None, method="batch"):
+    """
+    Parallel version of coin_engine.run_experiments: one process pool is shared
+    by all experiments, and experiment i uses the i-th child of SeedSequence(seed).
+    Returns a list of (tosses, heads, tails) tuples.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    experiment_seeds = seed_sequence(seed).spawn(len(experiments))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for tosses, experiment_seed in zip(experiments, experiment_seeds):
+            heads, tails = parallel_count_heads(tosses, p_heads, experiment_seed, workers, method, executor=pool)
+            results.append((tosses, heads, tails))
+    return results
+
+
+if __name__ == "__main__":
+    for experiment, heads, tails in parallel_run_experiments([10**6, 10**8, 10**9], p_heads=0.6, seed=2024):
+        print("experiment:",experiment)
+        print("heads =",heads,"  tails = ",tails)
+        print("the ratio of #heads/#tails is",(round(heads/tails,4)))
+        print()
@@ -0,0 +1,102 @@
+# Seeded random number streams shared by the QBronze course scripts
+#
+# The course scripts used to call the global random.randrange, so no two runs
+# could be compared. Every random draw now comes from a numpy.random.Generator
+# created here:
+#   - make_generator(seed) gives one generator; the same seed gives the same draws,
+#   - stream(seed, experiment, worker, ...) gives an independent generator for
+#     each key, the same one every time, whatever order the keys are used in,
+#   - spawn_generators(seed, count) gives `count` independent generators.
+#
+# When no seed is passed, the seed is read from the QBRONZE_SEED environment
+# variable if it is set, so a whole benchmark run can be made reproducible
+# without changing the scripts: the process keeps one root SeedSequence for it
+# and every unseeded call gets its next child, so the calls still draw
+# independent streams. Otherwise fresh entropy is used.
+#
+# The draw functions below produce whole arrays at once, replacing one Python
+# call per sample.
+
+import os
+
+import numpy as np
+
+SEED_VARIABLE = "QBRONZE_SEED"
+
+# root SeedSequence of the unseeded calls of this process, with the seed it
+# was made from (created when QBRONZE_SEED is first used)
+_default_root = None
+_default_root_seed = None
+
+
+def default_seed():
+    """
+    Return the seed set in the QBRONZE_SEED environment variable, or None.
+    """
+    value = os.environ.get(SEED_VARIABLE, "").strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{SEED_VARIABLE} must be an integer, got {value!r}") from None
+
+
+def seed_sequence(seed=None):
+    """
+    Return a numpy.random.SeedSequence for `seed` (an int, a SeedSequence or
+    None for the default seed). With seed None and QBRONZE_SEED set, each call
+    returns the next child of the process's root sequence for that seed.
+    """
+    global _default_root, _default_root_seed
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if seed is not None:
+        return np.random.SeedSequence(seed)
+    seed = default_seed()
+    if seed is None:
+        return np.random.SeedSequence()
+    if _default_root is None or _default_root_seed != seed:
+        _default_root, _default_root_seed = np.random.SeedSequence(seed), seed
+    return _default_root.spawn(1)[0]
+
+
+def make_generator(seed=None):
+    """
+    Return a NumPy random generator. Passing the same seed gives the same
+    draws; unseeded calls give independent generators.
+    """
+    return np.random.default_rng(seed_sequence(seed))
+
+
+def stream(seed, *key):
+    """
+    Return the generator for `key` (e.g. an experiment number and a worker
+    number). Different keys give independent streams, and stream(seed, i) is
+    the i-th generator of spawn_generators(seed, count). With seed None, the
+    keys are applied to a new default sequence (see seed_sequence).
+    """
+    root = seed_sequence(seed)
+    child = np.random.SeedSequence(root.entropy, spawn_key=root.spawn_key + tuple(key), pool_size=root.pool_size)
+    return np.random.default_rng(child)
+
+
+def spawn_generators(seed, count):
+    """
+    Return `count` independent generators derived from `seed`.
+    """
+    return [np.random.default_rng(child) for child in seed_sequence(seed).spawn(count)]
+
+
+def randrange(rng, stop, size=None):
+    """
+    Bulk replacement for random.randrange(stop): `size` integers in {0, ..., stop-1}.
+    """
+    return rng.integers(stop, size=size)
+
+
+def bernoulli(rng, p, size=None):
+    """
+    `size` booleans, each True with probability p.
+    """
+    return rng.random(size) < p
@@ -0,0 +1,36 @@
+import numpy as np
+from scipy import sparse
+
+from markov_chain import evolve, stationary_distribution, transition_matrix
+
+# the Coins Game has two states (head and tail); here the same kind of system has a million states
+#
+# the states 0,1,...,999999 are arranged on a circle and at every step
+#     we stay in the same state with probability 0.5,
+#     move one state forward with probability 0.3,
+#     and move one state backward with probability 0.2
+number_of_states = 10**6
+
+states = np.arange(number_of_states)
+rows = np.concatenate([states, (states+1) % number_of_states, (states-1) % number_of_states])
+columns = np.concatenate([states, states, states])
+probabilities = np.concatenate([np.full(number_of_states,0.5), np.full(number_of_states,0.3), np.full(number_of_states,0.2)])
+
+# only 3 of the 10^6 entries of each column are non-zero, so the table is stored as a sparse matrix
+matrix = transition_matrix(sparse.csr_matrix((probabilities,(rows,columns)),shape=(number_of_states,number_of_states)))
+
+# start in state 0 with probability 1
+initial_probability = np.zeros(number_of_states)
+initial_probability[0] = 1
+
+iterations = [10,100,1000]
+
+for iteration, distribution in zip(iterations, evolve(matrix, initial_probability, iterations)):
+    print("after",iteration,"steps:")
+    print("    the most probable state is",np.argmax(distribution),"with probability",distribution.max())
+    print("    the expected distance travelled is",round(np.sum(distribution*np.where(states<number_of_states//2,states,states-number_of_states)),4))
+    print()
+
+# in the long run every state is equally likely
+stationary = stationary_distribution(matrix)
+print("the stationary probabilities are between",stationary.min(),"and",stationary.max())
@@ -1,26 +1,37 @@
+from markov_chain import COINS_GAME_MATRIX, convergence_report, evolve, evolve_until_converged, stationary_distribution
+
 # define iterations as a list
-iterations = [20,30,50]
-
-for iteration in iterations:
-    
-    # initial probabilites
-    prob_head = 1
-    prob_tail = 0
-    
+# (evolve uses repeated squaring of the table, so billions of iterations are as cheap as 20)
+iterations = [20,30,50,10**9]
+
+# initial probabilites
+initial_probability = [1,0]
+
+# the probabilities after all iterations are computed in a single pass
+distributions = evolve(COINS_GAME_MATRIX, initial_probability, iterations)
+
+for iteration, [prob_head,prob_tail] in zip(iterations, distributions):
+
     print("the number of iterations is",iteration)
-    
-    for i in range(iteration):
-         # the new probability of head is calculated by using the first row of table
-        new_prob_head = prob_head * 0.6 + prob_tail * 0.3
-
-        # the new probability of tail is calculated by using the second row of table
-        new_prob_tail = prob_head * 0.4 + prob_tail * 0.7
-
-        # update the probabilities
-        prob_head = new_prob_head
-        prob_tail = new_prob_tail
-    
+
     # print prob_head and prob_tail
     print("the probability of getting head after",iteration,"coin tosses is",prob_head)
     print("the probability of getting tail after",iteration,"coin tosses is",prob_tail)
-    print()
\ No newline at end of file
+    print()
+
+# the probabilities that do not change anymore after a coin toss
+[prob_head,prob_tail] = stationary_distribution(COINS_GAME_MATRIX)
+print("the stationary probability of getting head is",prob_head)
+print("the stationary probability of getting tail is",prob_tail)
+print()
+
+# instead of guessing the number of iterations, stop as soon as the probabilities do not change anymore
+# (total-variation distance to the stationary probabilities below 10^-12)
+result = evolve_until_converged(COINS_GAME_MATRIX, initial_probability, threshold=1e-12)
+print("the probabilities converged after",result.steps,"coin tosses:",result.distribution)
+
+# how many steps this table needs, computed from its eigenvalues
+report = convergence_report(COINS_GAME_MATRIX)
+print("second eigenvalue:",report.second_eigenvalue,"  spectral gap:",report.spectral_gap)
+print("mixing time (distance at most 1/4 from any starting state):",report.mixing_time,
+      "  upper bound from the spectral gap:",round(report.mixing_time_bound,2))
@@ -0,0 +1,298 @@
+# Markov chain engine for the Coins Game
+#
+# A transition matrix has one column per current state and one row per next
+# state, as in the table used by the Coins Game scripts:
+#
+#     new_prob_head = prob_head * 0.6 + prob_tail * 0.3
+#     new_prob_tail = prob_head * 0.4 + prob_tail * 0.7
+#
+# so the distribution after one step is matrix @ distribution. Instead of
+# repeating this n times, the distribution after n steps is computed with the
+# squares matrix, matrix^2, matrix^4, ..., which needs O(log n) matrix products.
+#
+# Systems with many states and few transitions per state are stored as
+# scipy.sparse CSR matrices instead. Squaring would fill them in, so they are
+# evolved one sparse matrix-vector product per step, in O(number of transitions).
+#
+# evolve_until_converged and convergence_report tell how many steps a chain
+# needs before its distribution stops changing, instead of guessing horizons.
+
+from collections import namedtuple
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse import linalg as sparse_linalg
+
+# the biased coin of the Coins Game (columns: head, tail)
+COINS_GAME_MATRIX = np.array([
+    [0.6, 0.3],
+    [0.4, 0.7],
+])
+
+# transition_matrix stores a matrix as sparse when at most this fraction of
+# its entries are non-zero and it has at least SPARSE_MIN_STATES states
+SPARSE_DENSITY = 0.05
+SPARSE_MIN_STATES = 256
+
+# result of evolve_until_converged
+Convergence = namedtuple("Convergence", ["distribution", "steps", "distance", "converged"])
+
+# result of convergence_report
+ConvergenceReport = namedtuple("ConvergenceReport", [
+    "stationary", "second_eigenvalue", "spectral_gap", "relaxation_time", "mixing_time", "mixing_time_bound",
+])
+
+
+def check_stochastic(matrix, tolerance=1e-9):
+    """
+    Raise ValueError unless `matrix` is square with non-negative entries and
+    every column adding up to 1. Returns the matrix as a float array, or as a
+    float CSR matrix if it was given as a scipy.sparse matrix.
+    """
+    if sparse.issparse(matrix):
+        matrix = sparse.csr_matrix(matrix, dtype=float)
+        entries = matrix.data
+        column_sums = np.asarray(matrix.sum(axis=0)).ravel()
+    else:
+        matrix = np.asarray(matrix, dtype=float)
+        entries = matrix
+        column_sums = matrix.sum(axis=0) if matrix.ndim == 2 else None
+    if matrix.ndim != 2 or matrix.shape[0] != matrix.shape[1]:
+        raise ValueError(f"transition matrix must be square, got shape {matrix.shape}")
+    if np.any(entries < 0):
+        raise ValueError("transition matrix has negative entries")
+    if not np.allclose(column_sums, 1, atol=tolerance):
+        raise ValueError("every column of the transition matrix must add up to 1")
+    return matrix
+
+
+def transition_matrix(matrix, use_sparse=None):
+    """
+    Check `matrix` with check_stochastic and choose its storage: CSR if
+    use_sparse is True, dense if it is False. By default sparse matrices stay
+    sparse and dense ones become sparse when they are large and mostly zero.
+    """
+    matrix = check_stochastic(matrix)
+    if use_sparse is None:
+        use_sparse = sparse.issparse(matrix) or (
+            len(matrix) >= SPARSE_MIN_STATES and np.count_nonzero(matrix) <= SPARSE_DENSITY * matrix.size
+        )
+    if use_sparse:
+        return sparse.csr_matrix(matrix)
+    return matrix.toarray() if sparse.issparse(matrix) else matrix
+
+
+def _squares(matrix, steps):
+    # matrix^1, matrix^2, matrix^4, ... up to the highest power of two in `steps`
+    # (the columns are scaled back to a sum of 1 so rounding errors do not
+    # build up over the ~30 squarings needed for a billion steps)
+    squares = [matrix]
+    for _ in range(max(steps.bit_length() - 1, 0)):
+        square = squares[-1] @ squares[-1]
+        squares.append(square / square.sum(axis=0))
+    return squares
+
+
+def _advance(squares, distribution, steps):
+    # apply matrix^steps using the binary expansion of steps
+    bit = 0
+    while steps:
+        if steps & 1:
+            distribution = squares[bit] @ distribution
+        steps >>= 1
+        bit += 1
+    return distribution
+
+
+def _step(matrix, distribution, steps):
+    # apply the matrix `steps` times, one product per step
+    for _ in range(steps):
+        distribution = matrix @ distribution
+    return distribution
+
+
+def matrix_power(matrix, steps):
+    """
+    Return matrix^steps, computed by repeated squaring (as a dense array).
+    """
+    matrix = check_stochastic(matrix)
+    if sparse.issparse(matrix):
+        matrix = matrix.toarray()
+    if steps < 0:
+        raise ValueError(f"number of steps must be non-negative, got {steps}")
+    return _advance(_squares(matrix, steps), np.eye(len(matrix)), steps)
+
+
+def evolve(matrix, initial, horizons):
+    """
+    Return the distributions after each number of steps in `horizons`, as an
+    array with one row per horizon (in the order given).
+
+    All horizons are served by a single pass: the squares of the matrix are
+    computed once, up to the largest horizon, and the distribution is moved
+    forward from one horizon to the next one, so n can be in the billions.
+    `initial` may also be a matrix with one distribution per column; then
+    each row of the result is a matrix of the same shape.
+
+    A sparse matrix (see transition_matrix) is applied once per step instead,
+    which keeps memory at O(transitions + states) for millions of states.
+    """
+    matrix = check_stochastic(matrix)
+    initial = np.asarray(initial, dtype=float)
+    if initial.shape[0] != matrix.shape[0]:
+        raise ValueError(f"initial distribution has {initial.shape[0]} states, the matrix has {matrix.shape[0]}")
+    horizons = [int(steps) for steps in horizons]
+    if any(steps < 0 for steps in horizons):
+        raise ValueError("number of steps must be non-negative")
+
+    squares = None if sparse.issparse(matrix) else _squares(matrix, max(horizons, default=0))
+
+    results = [None] * len(horizons)
+    distribution, done = initial, 0
+    for index in sorted(range(len(horizons)), key=horizons.__getitem__):
+        if squares is None:
+            distribution = _step(matrix, distribution, horizons[index] - done)
+        else:
+            distribution = _advance(squares, distribution, horizons[index] - done)
+        done = horizons[index]
+        results[index] = distribution
+    return np.array(results)
+
+
+def evolve_many(matrix, initials, horizons):
+    """
+    Propagate many initial distributions together and return the table
+    table[i, h] = distribution after horizons[h] steps starting from initials[i].
+
+    The initial distributions are stacked as the columns of one matrix, so
+    each step is one matrix product for all of them instead of one loop each.
+    """
+    initials = np.asarray(initials, dtype=float)
+    if initials.ndim != 2:
+        raise ValueError("initials must be a list of distributions")
+    distributions = evolve(matrix, initials.T, horizons)
+    return distributions.reshape(len(distributions), *initials.T.shape).transpose(2, 0, 1)
+
+
+def stationary_distribution(matrix):
+    """
+    Return the distribution that does not change after a step, i.e. the
+    eigenvector of the matrix for eigenvalue 1, scaled to add up to 1.
+    For a sparse matrix the equations (matrix - I) x = 0 are solved directly
+    with a sparse solver instead, fixing the last entry of x to 1 (this needs
+    every state to be reachable from every other one).
+    """
+    matrix = check_stochastic(matrix)
+    if sparse.issparse(matrix):
+        equations = (matrix - sparse.identity(matrix.shape[0], format="csr")).tocsc()
+        vector = np.ones(matrix.shape[0])
+        vector[:-1] = sparse_linalg.spsolve(equations[:-1, :-1], -equations[:-1, -1].toarray().ravel())
+        return vector / vector.sum()
+    eigenvalues, eigenvectors = np.linalg.eig(matrix)
+    vector = np.real(eigenvectors[:, np.argmin(np.abs(eigenvalues - 1))])
+    return vector / vector.sum()
+
+
+def total_variation(distribution, stationary):
+    """
+    Total-variation distance 1/2 * sum |distribution - stationary|. If
+    `distribution` has one distribution per column, the largest distance.
+    """
+    distribution = np.asarray(distribution, dtype=float)
+    if distribution.ndim == 2:
+        stationary = np.asarray(stationary, dtype=float)[:, np.newaxis]
+    return float(np.max(np.abs(distribution - stationary).sum(axis=0)) / 2)
+
+
+def evolve_until_converged(matrix, initial, threshold=1e-9, max_steps=10**9, stationary=None):
+    """
+    Evolve `initial` until its total-variation distance to the stationary
+    distribution is at most `threshold`, and stop there (or at `max_steps`).
+    Returns a Convergence with the distribution, the number of steps taken,
+    the final distance and whether the threshold was reached.
+
+    The distance never grows from one step to the next, so for a dense matrix
+    the first step below the threshold is found by a binary search over the
+    squares of the matrix, with O(log steps) products. A sparse matrix is
+    checked after every step. `initial` may have one distribution per column.
+    """
+    matrix = check_stochastic(matrix)
+    if stationary is None:
+        stationary = stationary_distribution(matrix)
+    distribution = np.asarray(initial, dtype=float)
+    distance = total_variation(distribution, stationary)
+
+    if sparse.issparse(matrix):
+        steps = 0
+        while distance > threshold and steps < max_steps:
+            distribution = matrix @ distribution
+            steps += 1
+            distance = total_variation(distribution, stationary)
+        return Convergence(distribution, steps, distance, distance <= threshold)
+
+    if distance <= threshold:
+        return Convergence(distribution, 0, distance, True)
+
+    # square the matrix until 2^k steps are enough (or more than max_steps)
+    squares = [matrix]
+    while total_variation(squares[-1] @ distribution, stationary) > threshold and 2 ** (len(squares) - 1) < max_steps:
+        square = squares[-1] @ squares[-1]
+        squares.append(square / square.sum(axis=0))
+
+    # take the largest number of steps that is still above the threshold ...
+    steps = 0
+    for bit in reversed(range(len(squares))):
+        if steps + 2**bit > max_steps:
+            continue
+        candidate = squares[bit] @ distribution
+        if total_variation(candidate, stationary) > threshold:
+            distribution = candidate
+            steps += 2**bit
+
+    # ... and one more
+    if steps < max_steps:
+        distribution = matrix @ distribution
+        steps += 1
+    distance = total_variation(distribution, stationary)
+    return Convergence(distribution, steps, distance, distance <= threshold)
+
+
+def second_eigenvalue(matrix):
+    """
+    Return the second largest eigenvalue modulus of the matrix. The distance
+    to stationarity shrinks roughly by this factor at every step.
+    """
+    matrix = check_stochastic(matrix)
+    if sparse.issparse(matrix) and matrix.shape[0] > 3:
+        eigenvalues = sparse_linalg.eigs(matrix, k=2, which="LM", return_eigenvectors=False)
+    else:
+        eigenvalues = np.linalg.eigvals(matrix.toarray() if sparse.issparse(matrix) else matrix)
+    return float(np.sort(np.abs(eigenvalues))[-2])
+
+
+def convergence_report(matrix, threshold=0.25, max_steps=10**9):
+    """
+    Report how fast a chain converges, before running it:
+      - second_eigenvalue and spectral_gap = 1 - second_eigenvalue,
+      - relaxation_time = 1 / spectral_gap,
+      - mixing_time: the steps after which every starting state is within
+        `threshold` (total-variation distance) of the stationary distribution,
+      - mixing_time_bound: relaxation_time * log(1 / (threshold * min stationary)),
+        an upper bound on mixing_time for reversible chains.
+
+    mixing_time starts from every state at once (the identity matrix), so it
+    needs states x states memory; it is None for sparse matrices.
+    """
+    matrix = check_stochastic(matrix)
+    stationary = stationary_distribution(matrix)
+    modulus = second_eigenvalue(matrix)
+    gap = 1 - modulus
+    relaxation_time = 1 / gap if gap > 0 else float("inf")
+    bound = relaxation_time * np.log(1 / (threshold * stationary.min()))
+
+    mixing_time = None
+    if not sparse.issparse(matrix):
+        result = evolve_until_converged(matrix, np.eye(len(matrix)), threshold, max_steps, stationary)
+        mixing_time = result.steps if result.converged else None
+
+    return ConvergenceReport(stationary, modulus, gap, relaxation_time, mixing_time, float(bound))
@@ -4,9 +4,12 @@
 ##
 ## More samples like this can be found at http://oreilly-qc.github.io
 
-from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, transpile
+from qiskit import transpile
 from qiskit_aer import AerSimulator
-import math
+
+from bb84 import bb84_circuit, run_bb84, sift
+from bb84_postprocessing import postprocess, sifted_keys
+from measurement_decoding import counts_to_columns
 
 ## Uncomment the next line to see diagrams when running in a notebook
 #%matplotlib inline
@@ -16,117 +19,28 @@ import math
 ## to detect if someone (a spy) is eavesdropping on quantum communication between Alice and Bob
 
 # ============================================================================
-# STEP 1: SET UP QUANTUM AND CLASSICAL REGISTERS
+# STEPS 1-7: BUILD THE BB84 CIRCUIT
 # ============================================================================
 
-# Create quantum registers (qubits) for Alice, the fiber optic channel, and Bob
-alice = QuantumRegister(1, name='alice')  # Alice's qubit for preparing quantum states
-fiber = QuantumRegister(1, name='fiber')  # The communication channel (fiber optic cable)
-bob   = QuantumRegister(1, name='bob')    # Bob's qubit for receiving quantum states
-
-# Create classical registers (regular bits) to store measurement results
-alice_had = ClassicalRegister(1, name='ahad')  # Alice's Hadamard basis choice (0 or 1)
-alice_val = ClassicalRegister(1, name='aval')  # Alice's bit value to send (0 or 1)
-fiber_val = ClassicalRegister(1, name='fval')  # Spy's measurement result (if present)
-bob_had   = ClassicalRegister(1, name='bhad')  # Bob's Hadamard basis choice (0 or 1)
-bob_val   = ClassicalRegister(1, name='bval')  # Bob's measurement result (0 or 1)
-
-# Create the quantum circuit with all registers
-qc = QuantumCircuit(alice, fiber, bob, alice_had, alice_val, fiber_val, bob_had, bob_val)
-
-# ============================================================================
-# STEP 2: ALICE GENERATES TWO RANDOM BITS
-# ============================================================================
-
-# Generate Alice's random basis choice (Hadamard basis: YES=1 or NO=0)
-qc.reset(alice)              # Initialize Alice's qubit to |0⟩
-qc.h(alice)                  # Apply Hadamard gate to create superposition (50/50 chance)
-qc.measure(alice, alice_had) # Measure to get random bit for basis choice
-
-# Generate Alice's random bit value to send (0 or 1)
-qc.reset(alice)              # Reset Alice's qubit to |0⟩ again
-qc.h(alice)                  # Apply Hadamard gate for another random bit
-qc.measure(alice, alice_val) # Measure to get random bit value
-
-# ============================================================================
-# STEP 3: ALICE PREPARES HER QUBIT TO SEND
-# ============================================================================
-
-# Prepare the qubit in the state Alice wants to send
-qc.reset(alice)  # Start with |0⟩
-
-# If alice_val=1, flip to |1⟩ (X gate)
-with qc.if_test((alice_val, 1)):
-    qc.x(alice[0])
-
-# If alice_had=1, apply Hadamard (diagonal basis)
-with qc.if_test((alice_had, 1)):
-    qc.h(alice[0])
-
-# At this point:
-# - If alice_had=0 and alice_val=0: qubit is |0⟩ (computational basis)
-# - If alice_had=0 and alice_val=1: qubit is |1⟩ (computational basis)
-# - If alice_had=1 and alice_val=0: qubit is |+⟩ (Hadamard/diagonal basis)
-# - If alice_had=1 and alice_val=1: qubit is |-⟩ (Hadamard/diagonal basis)
-
-# ============================================================================
-# STEP 4: SEND THE QUBIT THROUGH THE FIBER
-# ============================================================================
-
-qc.swap(alice, fiber)  # Transfer Alice's qubit to the fiber optic channel
-
-# ============================================================================
-# STEP 5: SPY INTERCEPTS AND MEASURES (IF PRESENT)
-# ============================================================================
+# bb84.bb84_circuit builds the circuit for one qubit of the key exchange:
+#   1. quantum registers alice, fiber and bob, and classical registers
+#      ahad, aval (Alice's basis and value), fval (the spy's measurement),
+#      bhad, bval (Bob's basis and value)
+#   2. Alice generates two random bits: reset, Hadamard and measure her qubit
+#      for her basis choice, then again for the bit value she sends
+#   3. Alice prepares her qubit: X if aval=1, then H if ahad=1, giving
+#      |0>, |1> (computational basis) or |+>, |-> (Hadamard/diagonal basis)
+#   4. the qubit is swapped into the fiber
+#   5. the spy (if present) measures the fiber qubit in their basis, which
+#      COLLAPSES its state, and re-sends what they measured; if they chose the
+#      wrong basis, the qubit state is DESTROYED and Bob sees detectable errors
+#   6. Bob generates a random basis choice the same way Alice did
+#   7. the qubit is swapped to Bob, who applies H if bhad=1 and measures it
 
 spy_is_present = True  # Set to True to simulate a spy, False for no spy
+spy_had = True         # Spy's basis choice (True = Hadamard basis, False = computational)
 
-if spy_is_present:
-    qc.barrier()  # Visual separator in circuit diagram
-    
-    spy_had = True  # Spy's basis choice (True = Hadamard basis, False = computational)
-    
-    # Spy measures the qubit in their chosen basis
-    if spy_had:
-        qc.h(fiber)  # Apply Hadamard if measuring in diagonal basis
-    
-    qc.measure(fiber, fiber_val)  # Spy measures the qubit (COLLAPSES the state!)
-    
-    # Spy tries to restore the qubit to what they measured
-    qc.reset(fiber)  # Reset to |0⟩
-    
-    # Set to measured value
-    with qc.if_test((fiber_val, 1)):
-        qc.x(fiber[0])
-    
-    if spy_had:
-        qc.h(fiber)  # Apply Hadamard again if they used diagonal basis
-    
-    # PROBLEM: If spy chose wrong basis (different from Alice), the qubit state is DESTROYED!
-    # This creates detectable errors when Bob measures.
-
-qc.barrier()  # Visual separator
-
-# ============================================================================
-# STEP 6: BOB GENERATES A RANDOM BASIS CHOICE
-# ============================================================================
-
-# Bob randomly chooses which basis to measure in (independent of Alice)
-qc.reset(bob)            # Initialize Bob's qubit to |0⟩
-qc.h(bob)                # Apply Hadamard for random choice
-qc.measure(bob, bob_had) # Measure to get random basis choice (0 or 1)
-
-# ============================================================================
-# STEP 7: BOB RECEIVES AND MEASURES THE QUBIT
-# ============================================================================
-
-qc.swap(fiber, bob)  # Transfer qubit from fiber to Bob
-
-# If bob_had=1, measure in Hadamard basis
-with qc.if_test((bob_had, 1)):
-    qc.h(bob[0])
-
-qc.measure(bob, bob_val)  # Measure to get final bit value
+qc = bb84_circuit(spy_is_present=spy_is_present, spy_had=spy_had)
 
 # ============================================================================
 # STEP 8: EXECUTE THE QUANTUM CIRCUIT
@@ -148,29 +62,44 @@ result = job.result()
 counts = result.get_counts()
 print('counts:', counts)
 
-caught = False
-
-# Parse each measurement outcome
-for key, val in counts.items():
-    # Extract the classical bit values from the measurement string
-    # Format is: bval bhad fval aval ahad (reversed order)
-    bits = key.split(' ')
-    bval = int(bits[0])
-    bhad = int(bits[1])
-    f = int(bits[2])
-    aval = int(bits[3])
-    ahad = int(bits[4])
-    
-    # Check if Alice and Bob used the SAME basis
-    if ahad == bhad:
-        # If same basis but DIFFERENT values, spy must have interfered!
-        if aval != bval:
-            print('Caught a spy!')
-            caught = True
-
-if not caught:
+# Decode all measurement outcomes at once: one array of values per classical register
+# (no string parsing per outcome, see measurement_decoding.py), and sift them
+# with bb84.sift, which compares the values where the bases match
+columns, _ = counts_to_columns(counts, qc)
+trial = sift(columns['ahad'], columns['aval'], columns['bhad'], columns['bval'])
+
+# If Alice and Bob used the SAME basis but got DIFFERENT values, a spy must have interfered!
+if trial.detected:
+    print('Caught a spy!')
+else:
     print('No spies detected.')
 
+# ============================================================================
+# STEP 10: A FULL KEY EXCHANGE
+# ============================================================================
+
+# One qubit rarely catches the spy. bb84.py runs this same circuit with one shot
+# per qubit, so a whole key exchange of 10000 qubits is a single simulator job.
+exchange = run_bb84(10000, spy_is_present=spy_is_present, spy_had=spy_had)
+print(f"\nKey exchange of {exchange.trials} qubits:")
+print(f"  sifted key length: {exchange.sifted_length}")
+print(f"  quantum bit error rate: {exchange.qber:.4f}")
+print(f"  probability of detecting the spy: {exchange.detection_probability:.4f}")
+
+# ============================================================================
+# STEP 11: ERROR CORRECTION AND PRIVACY AMPLIFICATION
+# ============================================================================
+
+# Alice and Bob estimate the error rate, correct Bob's key with Cascade and hash
+# their keys into a shorter secret key the spy knows nothing about. When the
+# spy caused too many errors, no secret bits are left and they give up.
+secret = postprocess(*sifted_keys(exchange))
+print(f"  estimated error rate: {secret.estimated_qber:.4f}, corrected {secret.corrected_errors} errors")
+if secret.secret_length:
+    print(f"  shared secret key: {secret.secret_length} bits")
+else:
+    print('  Caught a spy! No secret key is left.')
+
 # ============================================================================
 # DISPLAY RESULTS
 # ============================================================================
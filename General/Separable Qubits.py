@@ -7,6 +7,9 @@ from qiskit_aer import Aer
 # Import Statevector to explicitly access the wavefunction
 from qiskit.quantum_info import Statevector
 
+# Import the product-state simulation, which keeps independent qubits apart
+from product_state import simulate_product_state
+
 
 # Create a quantum circuit with 3 qubits
 # (no classical bits needed since we are not measuring)
@@ -34,3 +37,16 @@ statevector = result.get_statevector(qc)
 # Print the statevector (this is equivalent to DumpMachine() in Q#)
 print("Quantum Statevector:")
 print(statevector)
+
+# Each qubit of this state is a factor of its own: 2 amplitudes per qubit
+separable = simulate_product_state(qc)
+print("\nThe same state as independent factors:")
+for factor in separable.factors:
+    print(f"  qubit {factor.qubits[0]}: {factor.statevector}")
+
+# The same pattern on 300 qubits: the full statevector would need 2^300
+# amplitudes, the product state stores 600
+wide = QuantumCircuit(300)
+wide.h(range(1, 300))
+wide_state = simulate_product_state(wide)
+print(f"\n300 qubits: {len(wide_state.factors)} factors, {wide_state.num_amplitudes} amplitudes stored")
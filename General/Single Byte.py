@@ -3,8 +3,9 @@
 # This sample generates a single random byte using eight unentangled qubits
 
 try:
-    from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, transpile
-    from qiskit_aer import AerSimulator
+    import numpy as np
+    from qrng import random_bytes, random_words
+    from randomness_tests import report, run_battery
     QISKIT_AVAILABLE = True
 except ImportError as e:
     print("Qiskit is not properly installed. Please install it using:")
@@ -20,81 +21,49 @@ try:
 except ImportError:
     MATPLOTLIB_AVAILABLE = False
 
-def generate_random_byte():
-    """
-    Generate a random byte (0-255) using 8 quantum bits in superposition.
-    Each qubit has equal probability of being 0 or 1 when measured.
-    """
-    
-    # Create quantum circuit with 8 qubits and 8 classical bits
-    qreg = QuantumRegister(8, 'q')
-    creg = ClassicalRegister(8, 'c')
-    qc = QuantumCircuit(qreg, creg)
-    
-    # Initialize qubits to |0⟩ state (this is automatic, but explicit for clarity)
-    # qc.reset() is equivalent to qc.initialize([1, 0], qubit) for each qubit
-    
-    # Apply Hadamard gates to all qubits to create superposition
-    # This puts each qubit in equal superposition of |0⟩ and |1⟩
-    for i in range(8):
-        qc.h(qreg[i])
-    
-    # Measure all qubits
-    qc.measure(qreg, creg)
-    
-    return qc
+# Number of bytes the randomness tests run on when the demonstration is small
+TEST_SAMPLES = 4096
 
 def run_quantum_random():
     """
     Execute the quantum circuit and return the random byte value.
     """
-    # Create the circuit
-    circuit = generate_random_byte()
-    
-    # Use Aer simulator
-    simulator = AerSimulator()
-    
-    # Transpile circuit for simulator
-    compiled_circuit = transpile(circuit, simulator)
+    # One shot of the 8-qubit Hadamard + measure circuit
+    # (qrng.random_word_circuit(8), built and transpiled once by qrng)
+    byte_value = int(random_bytes(1, width=8)[0])
     
-    # Execute the circuit once to get a single random result
-    job = simulator.run(compiled_circuit, shots=1)
-    result = job.result()
-    counts = result.get_counts(compiled_circuit)
-    
-    # Get the measurement result (binary string)
-    binary_result = list(counts.keys())[0]
-    
-    # Convert binary string to integer (byte value 0-255)
-    byte_value = int(binary_result, 2)
+    # Binary string of the measurement result
+    binary_result = f"{byte_value:08b}"
     
     return byte_value, binary_result
 
 def demonstrate_randomness(num_samples=100):
     """
     Generate multiple random bytes to demonstrate the randomness.
+    All samples come from a single simulator job with num_samples shots.
     """
     print("Generating random bytes using quantum superposition...\n")
     
-    results = []
-    for i in range(min(10, num_samples)):  # Show first 10 results
-        byte_val, binary = run_quantum_random()
-        results.append(byte_val)
-        print(f"Sample {i+1:2d}: Binary: {binary} → Decimal: {byte_val:3d}")
-    
-    if num_samples > 10:
-        # Generate remaining samples without printing each one
-        for i in range(10, num_samples):
-            byte_val, _ = run_quantum_random()
-            results.append(byte_val)
+    results = random_bytes(num_samples)
+    for i, byte_val in enumerate(results[:10]):  # Show first 10 results
+        print(f"Sample {i+1:2d}: Binary: {byte_val:08b} → Decimal: {byte_val:3d}")
     
     # Show statistics
     print(f"\nStatistics for {num_samples} samples:")
-    print(f"Min: {min(results)}")
-    print(f"Max: {max(results)}")
-    print(f"Average: {sum(results)/len(results):.2f}")
+    print(f"Min: {results.min()}")
+    print(f"Max: {results.max()}")
+    print(f"Average: {results.mean():.2f}")
     print(f"Expected average for uniform distribution: 127.5")
     
+    # Statistical test battery (see randomness_tests.py): the byte chi-square
+    # needs at least 5 expected counts in each of its 256 bins, so a small run
+    # is tested on a separate, larger sample
+    print()
+    if num_samples >= 5 * 256:
+        report(run_battery(results))
+    else:
+        report(run_battery(random_bytes(TEST_SAMPLES)))
+    
     return results
 
 if __name__ == "__main__":
@@ -114,6 +83,13 @@ if __name__ == "__main__":
     # Demonstrate with multiple samples
     sample_results = demonstrate_randomness(100)
     
+    print("\n" + "="*50)
+    
+    # Wider registers: a 64-qubit register gives a whole 64-bit word per shot
+    print("Random 64-bit words from a 64-qubit register:")
+    for word in random_words(4, np.uint64):
+        print(f"0x{word:016X}")
+    
     # Optional: Create a simple histogram (requires matplotlib)
     if MATPLOTLIB_AVAILABLE:
         plt.figure(figsize=(10, 6))
@@ -0,0 +1,271 @@
+# BB84 key exchange engine for Quantum Spy Hunter
+#
+# Quantum Spy Hunter.py sends a single qubit from Alice to Bob with shots=1.
+# Here the same alice/fiber/bob circuit is run once with shots=n and per-shot
+# memory: every shot is one qubit of the key exchange, so a key of n qubits
+# costs one simulator job. The shots are decoded in one vectorized step and
+# Alice and Bob keep the bits where they used the same basis (the sifted key).
+#
+# The circuit only uses X, H, reset, measurements, swaps and classically
+# controlled gates, so its outcomes have a simple closed form:
+#   - Alice's basis, Alice's value and Bob's basis are fair coin flips,
+#   - measuring a qubit in the basis it was prepared in gives its value back,
+#     measuring it in the other basis gives a fair coin flip,
+#   - the spy measures in their basis and re-sends what they saw in that basis.
+# simulate_bb84 samples these rules directly with NumPy arrays, which is orders
+# of magnitude faster than the circuit simulator for large keys.
+# cross_validate checks that both give the same outcome distribution.
+# simulate_bb84 also models a spy who only intercepts part of the qubits or
+# picks a random basis, and a noisy fiber; bb84_sweep.py sweeps over these.
+
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, transpile
+from qiskit_aer import AerSimulator
+from scipy.stats import chi2_contingency
+
+from measurement_decoding import memory_to_columns
+
+# Result of a key exchange:
+#   trials              number of qubits sent
+#   alice_bases, ...    per-trial arrays (basis 1 = Hadamard basis)
+#   sifted_length       number of trials where Alice and Bob used the same basis
+#   errors              sifted bits where Alice's and Bob's values differ
+#   qber                quantum bit error rate, errors / sifted_length
+#   detection_probability
+#                       chance that comparing `sample_size` sifted bits
+#                       reveals at least one error, 1 - (1 - qber)^sample_size
+#   detected            whether an error was actually seen in the compared bits
+BB84Result = namedtuple("BB84Result", [
+    "trials", "alice_bases", "alice_values", "spy_values", "bob_bases", "bob_values",
+    "sifted_length", "errors", "qber", "detection_probability", "detected",
+])
+
+# options of simulate_bb84
+SPY_STRATEGIES = ("z", "x", "random")
+NOISE_MODELS = (None, "bitflip", "depolarizing")
+
+
+def bb84_circuit(spy_is_present=True, spy_had=True):
+    """
+    Return the Quantum Spy Hunter circuit for one qubit of the key exchange.
+    Classical registers: ahad, aval (Alice's basis and value), fval (the spy's
+    measurement), bhad, bval (Bob's basis and value).
+    """
+    alice = QuantumRegister(1, name='alice')
+    fiber = QuantumRegister(1, name='fiber')
+    bob = QuantumRegister(1, name='bob')
+    alice_had = ClassicalRegister(1, name='ahad')
+    alice_val = ClassicalRegister(1, name='aval')
+    fiber_val = ClassicalRegister(1, name='fval')
+    bob_had = ClassicalRegister(1, name='bhad')
+    bob_val = ClassicalRegister(1, name='bval')
+    qc = QuantumCircuit(alice, fiber, bob, alice_had, alice_val, fiber_val, bob_had, bob_val)
+
+    # Alice picks a random basis and a random value
+    qc.reset(alice)
+    qc.h(alice)
+    qc.measure(alice, alice_had)
+    qc.reset(alice)
+    qc.h(alice)
+    qc.measure(alice, alice_val)
+
+    # and prepares her qubit accordingly
+    qc.reset(alice)
+    with qc.if_test((alice_val, 1)):
+        qc.x(alice[0])
+    with qc.if_test((alice_had, 1)):
+        qc.h(alice[0])
+
+    # send it through the fiber
+    qc.swap(alice, fiber)
+
+    # the spy measures in their basis and re-sends what they saw
+    if spy_is_present:
+        qc.barrier()
+        if spy_had:
+            qc.h(fiber)
+        qc.measure(fiber, fiber_val)
+        qc.reset(fiber)
+        with qc.if_test((fiber_val, 1)):
+            qc.x(fiber[0])
+        if spy_had:
+            qc.h(fiber)
+
+    qc.barrier()
+
+    # Bob picks a random basis and measures the received qubit in it
+    qc.reset(bob)
+    qc.h(bob)
+    qc.measure(bob, bob_had)
+    qc.swap(fiber, bob)
+    with qc.if_test((bob_had, 1)):
+        qc.h(bob[0])
+    qc.measure(bob, bob_val)
+    return qc
+
+
+@lru_cache(maxsize=None)
+def _simulator():
+    return AerSimulator()
+
+
+@lru_cache(maxsize=None)
+def _compiled_circuit(spy_is_present, spy_had):
+    circuit = bb84_circuit(spy_is_present, spy_had)
+    return circuit, transpile(circuit, _simulator())
+
+
+def sift(alice_bases, alice_values, bob_bases, bob_values, sample_size=None, spy_values=None):
+    """
+    Compare Alice's and Bob's results and return the BB84Result.
+    `sample_size` sifted bits are compared publicly (all of them by default).
+    """
+    same_basis = alice_bases == bob_bases
+    sifted_length = int(np.count_nonzero(same_basis))
+    mismatches = same_basis & (alice_values != bob_values)
+    errors = int(np.count_nonzero(mismatches))
+    qber = errors / sifted_length if sifted_length else 0.0
+
+    if sample_size is None:
+        sample_size = sifted_length
+    sample_size = min(sample_size, sifted_length)
+    # the compared bits are the first `sample_size` sifted bits
+    compared = np.flatnonzero(same_basis)[:sample_size]
+    detected = bool(mismatches[compared].any())
+
+    return BB84Result(
+        len(alice_bases),
+        alice_bases, alice_values, spy_values, bob_bases, bob_values,
+        sifted_length, errors, qber, 1 - (1 - qber) ** sample_size, detected,
+    )
+
+
+def _random_bits(rng, n):
+    return rng.integers(0, 2, size=n, dtype=np.uint8)
+
+
+def _measure(rng, prepared_bases, prepared_values, measured_bases):
+    # same basis: the prepared value; other basis: a fair coin flip
+    return np.where(prepared_bases == measured_bases, prepared_values, _random_bits(rng, len(prepared_values)))
+
+
+def simulate_bb84(n, spy_is_present=True, spy_had=True, sample_size=None, seed=None,
+                  intercept_fraction=1.0, spy_strategy=None, noise=None, noise_probability=0.0):
+    """
+    Same as run_bb84 with method="numpy": sample the key exchange of `n`
+    qubits directly from the closed-form outcome rules, without a circuit.
+    `seed` seeds the NumPy generator.
+
+    This path also models what the circuit does not:
+      - intercept_fraction: the share of the qubits the spy intercepts,
+      - spy_strategy: the spy's basis, "z" (computational), "x" (Hadamard) or
+        "random" (a fresh basis for every qubit); by default "x" if spy_had
+        else "z", as in the circuit,
+      - noise: "bitflip" (an X gate with probability noise_probability) or
+        "depolarizing" (the qubit is replaced by the maximally mixed state
+        with probability noise_probability) on the fiber, after the spy.
+    """
+    if n <= 0:
+        raise ValueError(f"number of qubits must be positive, got {n}")
+    if not 0 <= intercept_fraction <= 1 or not 0 <= noise_probability <= 1:
+        raise ValueError("intercept_fraction and noise_probability must be in [0, 1]")
+    if spy_strategy is None:
+        spy_strategy = "x" if spy_had else "z"
+    if spy_strategy not in SPY_STRATEGIES:
+        raise ValueError(f"unknown spy strategy {spy_strategy!r}, expected one of {SPY_STRATEGIES}")
+    if noise not in NOISE_MODELS:
+        raise ValueError(f"unknown noise {noise!r}, expected one of {NOISE_MODELS}")
+    rng = np.random.default_rng(seed)
+
+    alice_bases = _random_bits(rng, n)
+    alice_values = _random_bits(rng, n)
+    sent_bases, sent_values = alice_bases, alice_values
+
+    spy_values = None
+    if spy_is_present and intercept_fraction > 0:
+        if spy_strategy == "random":
+            spy_bases = _random_bits(rng, n)
+        else:
+            spy_bases = np.full(n, int(spy_strategy == "x"), dtype=np.uint8)
+        spy_values = _measure(rng, sent_bases, sent_values, spy_bases)
+        if intercept_fraction < 1:
+            intercepted = rng.random(n) < intercept_fraction
+            spy_values = np.where(intercepted, spy_values, 0).astype(np.uint8)
+            spy_bases = np.where(intercepted, spy_bases, sent_bases)
+            sent_values = np.where(intercepted, spy_values, sent_values)
+        else:
+            sent_values = spy_values
+        sent_bases = spy_bases
+
+    if noise == "bitflip" and noise_probability > 0:
+        # X flips the value of |0>/|1> and leaves |+>/|-> unchanged (up to a phase)
+        flipped = (rng.random(n) < noise_probability) & (sent_bases == 0)
+        sent_values = sent_values ^ flipped.astype(np.uint8)
+    elif noise == "depolarizing" and noise_probability > 0:
+        # a maximally mixed qubit gives a fair coin flip in any basis
+        mixed = rng.random(n) < noise_probability
+        sent_values = np.where(mixed, _random_bits(rng, n), sent_values)
+
+    bob_bases = _random_bits(rng, n)
+    bob_values = _measure(rng, sent_bases, sent_values, bob_bases)
+
+    return sift(alice_bases, alice_values, bob_bases, bob_values, sample_size, spy_values=spy_values)
+
+
+def run_bb84(n, spy_is_present=True, spy_had=True, sample_size=None, seed=None, method="circuit"):
+    """
+    Simulate a key exchange of `n` qubits and return the BB84Result.
+
+    method="circuit" runs the Spy Hunter circuit as a single simulator job of
+    `n` shots (`seed` fixes the simulator's seed); method="numpy" uses the
+    much faster simulate_bb84.
+    """
+    if method == "numpy":
+        return simulate_bb84(n, spy_is_present, spy_had, sample_size, seed)
+    if method != "circuit":
+        raise ValueError(f"unknown method {method!r}, expected 'circuit' or 'numpy'")
+    if n <= 0:
+        raise ValueError(f"number of qubits must be positive, got {n}")
+    circuit, compiled = _compiled_circuit(bool(spy_is_present), bool(spy_had))
+    job = _simulator().run(compiled, shots=n, memory=True, seed_simulator=seed)
+    columns = memory_to_columns(job.result().get_memory(compiled), circuit)
+
+    return sift(columns['ahad'], columns['aval'], columns['bhad'], columns['bval'], sample_size,
+                spy_values=columns['fval'] if spy_is_present else None)
+
+
+def _outcome_counts(result):
+    # histogram of the packed (ahad, aval, fval, bhad, bval) outcomes
+    spy_values = result.spy_values if result.spy_values is not None else np.zeros_like(result.alice_bases)
+    outcomes = (result.alice_bases.astype(np.int64) | result.alice_values << 1 | spy_values << 2
+                | result.bob_bases << 3 | result.bob_values << 4)
+    return np.bincount(outcomes, minlength=32)
+
+
+def cross_validate(n, spy_is_present=True, spy_had=True, seed=None):
+    """
+    Run both methods with `n` qubits and compare the distributions of the
+    full outcome (Alice's basis and value, the spy's value, Bob's basis and
+    value) with a chi-square test of homogeneity. Returns
+    (circuit result, numpy result, chi-square statistic, p-value); a p-value
+    below ~0.01 means the two methods disagree.
+    """
+    circuit_result = run_bb84(n, spy_is_present, spy_had, seed=seed, method="circuit")
+    numpy_result = run_bb84(n, spy_is_present, spy_had, seed=seed, method="numpy")
+    table = np.array([_outcome_counts(circuit_result), _outcome_counts(numpy_result)])
+    table = table[:, table.sum(axis=0) > 0]
+    statistic, p_value = chi2_contingency(table)[:2] if table.shape[1] > 1 else (0.0, 1.0)
+    return circuit_result, numpy_result, float(statistic), float(p_value)
+
+
+if __name__ == "__main__":
+    # the circuit and NumPy methods must give the same outcome distribution
+    n = 100000
+    for spy_is_present in (False, True):
+        circuit_result, numpy_result, statistic, p_value = cross_validate(n, spy_is_present, seed=3)
+        verdict = "agree" if p_value >= 0.01 else "DISAGREE"
+        print(f"{'spy' if spy_is_present else 'no spy':<7} {n} qubits: QBER {circuit_result.qber:.4f} (circuit), "
+              f"{numpy_result.qber:.4f} (numpy), chi-square {statistic:.2f}, p-value {p_value:.4f}: {verdict}")
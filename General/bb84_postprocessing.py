@@ -0,0 +1,264 @@
+# Classical post-processing of the BB84 sifted key
+#
+# After sifting, Alice's and Bob's keys still differ where the spy or the
+# fiber flipped a bit, and the spy knows part of them. postprocess() turns the
+# sifted keys into a shared secret key in four steps:
+#   1. error estimation: Alice and Bob publicly compare a random sample of
+#      their bits, which gives the quantum bit error rate (QBER), and drop
+#      those bits from the key; above ~11% no secret key can be left and they
+#      stop here,
+#   2. error correction with Cascade: they compare the parities of blocks of
+#      shuffled keys and binary search every block with differing parities
+#      for an error; fixing a bit reopens the blocks of earlier passes that
+#      contain it, which are searched again,
+#   3. verification: they compare a 64-bit hash of their corrected keys,
+#   4. privacy amplification: both hash their key with the same random
+#      Toeplitz matrix into a shorter key, removing what the spy knows from the
+#      QBER and from the parities revealed on the public channel.
+#
+# Keys are uint8 arrays of 0s and 1s. Block parities come from prefix XORs of
+# the whole key, every pass searches all of its blocks at once, and the
+# Toeplitz hash is a convolution computed with FFTs, so a million-bit key is
+# processed in about a second.
+
+from collections import namedtuple
+
+import numpy as np
+from scipy.fft import irfft, next_fast_len, rfft
+
+# bits of the hash Alice and Bob compare to check that error correction worked
+VERIFICATION_BITS = 64
+
+# Result of postprocess:
+#   sifted_length       bits in the sifted keys
+#   estimated_qber      share of the publicly compared bits that differ
+#   qber                QBER found by error correction (errors per key bit
+#                       left after the comparison)
+#   corrected_errors    bits Bob flipped during error correction
+#   leaked_bits         parities and hash bits revealed on the public channel
+#   verified            whether the corrected keys have the same hash
+#   secret_length       length of the secret key (0 when the exchange is aborted)
+#   alice_key, bob_key  the secret keys, equal when verified
+#   aborted             whether the exchange was aborted without a secret key
+#   reason              why it was aborted, None otherwise
+PostProcessingResult = namedtuple("PostProcessingResult", [
+    "sifted_length", "estimated_qber", "qber", "corrected_errors", "leaked_bits",
+    "verified", "secret_length", "alice_key", "bob_key", "aborted", "reason",
+])
+
+
+def sifted_keys(result):
+    """
+    Return Alice's and Bob's sifted keys from a bb84.BB84Result.
+    """
+    same_basis = result.alice_bases == result.bob_bases
+    return result.alice_values[same_basis], result.bob_values[same_basis]
+
+
+def binary_entropy(p):
+    """
+    Return the binary entropy h(p) in bits.
+    """
+    if p <= 0 or p >= 1:
+        return 0.0
+    return float(-p * np.log2(p) - (1 - p) * np.log2(1 - p))
+
+
+def _prefix_parities(bits):
+    # prefix[i] = parity of bits[:i], so the parity of bits[a:b] is prefix[b] ^ prefix[a]
+    prefix = np.zeros(len(bits) + 1, dtype=np.uint8)
+    np.bitwise_xor.accumulate(bits, out=prefix[1:])
+    return prefix
+
+
+def estimate_qber(alice_key, bob_key, fraction=0.1, rng=None):
+    """
+    Estimate the QBER by publicly comparing a random `fraction` of the key
+    bits (at least one). The compared bits are known to the spy, so they
+    leave the key. Returns (share of compared bits that differ, positions of
+    the bits that were not compared, in key order).
+    """
+    if not 0 < fraction < 1:
+        raise ValueError(f"need 0 < fraction < 1, got {fraction}")
+    n = len(alice_key)
+    sample = max(1, int(round(n * fraction)))
+    if sample >= n:
+        raise ValueError(f"a key of {n} bits is too short to estimate the QBER")
+    rng = np.random.default_rng(rng)
+    compared = np.zeros(n, dtype=bool)
+    compared[rng.choice(n, size=sample, replace=False)] = True
+    errors = np.count_nonzero(alice_key[compared] != bob_key[compared])
+    return errors / sample, np.flatnonzero(~compared)
+
+
+def _search_blocks(alice_prefix, bob_prefix, lows, highs):
+    # binary search every block [low, high) of differing parity at the same
+    # time; returns the position of one error in each block and the number
+    # of parities Alice revealed
+    leaked = 0
+    while True:
+        active = highs - lows > 1
+        if not active.any():
+            return lows, leaked
+        leaked += int(np.count_nonzero(active))
+        middles = (lows + highs) // 2
+        differ = (alice_prefix[middles] ^ alice_prefix[lows]) != (bob_prefix[middles] ^ bob_prefix[lows])
+        highs = np.where(active & differ, middles, highs)
+        lows = np.where(active & ~differ, middles, lows)
+
+
+def cascade(alice_key, bob_key, qber, passes=4, rng=None):
+    """
+    Correct Bob's key with the Cascade protocol and return
+    (corrected key, number of corrected bits, number of parities revealed).
+
+    Pass i compares the parities of blocks of 2^i * k1 bits of the key
+    shuffled by a public random permutation, with k1 ~ 0.73 / qber, and fixes
+    one error in every block whose parities differ. Each fix changes the
+    parity of the blocks of earlier passes that contain the fixed bit, so the
+    passes done so far are searched again until all their parities agree.
+    """
+    rng = np.random.default_rng(rng)
+    n = len(alice_key)
+    bob_key = bob_key.copy()
+    block_size = max(4, min(n, int(0.73 / qber))) if qber > 0 else n
+    # per pass: permutation, block starts, Alice's prefix parities
+    orders = []
+    corrected = leaked = 0
+
+    for i in range(passes):
+        order = np.arange(n) if i == 0 else rng.permutation(n)
+        starts = np.arange(0, n, block_size)
+        orders.append((order, starts, _prefix_parities(alice_key[order])))
+        # Alice announces the parity of every block of the new pass
+        leaked += len(starts)
+
+        pending = True
+        while pending:
+            pending = False
+            for order, starts, alice_prefix in orders[::-1]:
+                ends = np.append(starts[1:], n)
+                bob_prefix = _prefix_parities(bob_key[order])
+                differ = (alice_prefix[ends] ^ alice_prefix[starts]) != (bob_prefix[ends] ^ bob_prefix[starts])
+                if not differ.any():
+                    continue
+                positions, search_leak = _search_blocks(alice_prefix, bob_prefix, starts[differ], ends[differ])
+                bob_key[order[positions]] ^= 1
+                corrected += len(positions)
+                leaked += search_leak
+                pending = True
+        block_size = min(n, 2 * block_size)
+    return bob_key, corrected, leaked
+
+
+def toeplitz_hash(keys, seed_bits, output_length):
+    """
+    Hash `keys` (n bits, or one n-bit key per row) with the
+    output_length x n Toeplitz matrix T[i, j] = seed_bits[i - j + n - 1] over
+    GF(2); `seed_bits` must hold n + output_length - 1 bits. T @ key is the
+    middle part of the convolution of seed_bits with the key, computed with
+    real FFTs; the seed's transform is shared by all the keys.
+    """
+    keys = np.asarray(keys, dtype=np.uint8)
+    n = keys.shape[-1]
+    if len(seed_bits) != n + output_length - 1:
+        raise ValueError(f"need {n + output_length - 1} seed bits, got {len(seed_bits)}")
+    if output_length <= 0:
+        return np.zeros(keys.shape[:-1] + (0,), dtype=np.uint8)
+    size = next_fast_len(len(seed_bits) + n - 1, real=True)
+    transform = rfft(seed_bits, size) * rfft(keys, size, axis=-1, workers=-1)
+    convolution = irfft(transform, size, axis=-1, workers=-1)
+    return (np.rint(convolution[..., n - 1:n - 1 + output_length]).astype(np.int64) & 1).astype(np.uint8)
+
+
+def secret_key_length(n, qber, leaked_bits, epsilon=1e-10):
+    """
+    Return how many secret bits privacy amplification can keep from an
+    n-bit corrected key: n (1 - h(qber)) minus the revealed bits and a margin
+    of 2 log2(1 / epsilon) bits for the hashing (0 if nothing is left).
+    """
+    length = n * (1 - binary_entropy(qber)) - leaked_bits - 2 * np.log2(1 / epsilon)
+    return max(0, int(length))
+
+
+def postprocess(alice_key, bob_key, seed=None, estimation_fraction=0.1, passes=4, epsilon=1e-10):
+    """
+    Run error estimation, Cascade, verification and privacy amplification on
+    the sifted keys and return the PostProcessingResult. The public random
+    choices (compared bits, permutations, hash seeds) come from the NumPy
+    generator seeded with `seed`. The exchange is aborted (secret_length 0,
+    with the reason in the result) when the sifted key is too short to
+    estimate the QBER, the estimated QBER leaves no secret bits (above ~11%,
+    where n (1 - 2 h(qber)) <= 0), the verification hashes differ or no
+    secret bits are left after error correction.
+    """
+    alice_key = np.asarray(alice_key, dtype=np.uint8)
+    bob_key = np.asarray(bob_key, dtype=np.uint8)
+    if alice_key.shape != bob_key.shape or alice_key.ndim != 1:
+        raise ValueError("Alice's and Bob's keys must be bit arrays of the same length")
+    sifted_length = len(alice_key)
+    rng = np.random.default_rng(seed)
+    empty = np.zeros(0, dtype=np.uint8)
+
+    if sifted_length < 2:
+        return PostProcessingResult(sifted_length, 0.5, 0.5, 0, 0, False, 0, empty, empty, True,
+                                    f"a sifted key of {sifted_length} bits is too short to estimate the QBER")
+    estimated_qber, kept = estimate_qber(alice_key, bob_key, estimation_fraction, rng)
+    alice_key, bob_key = alice_key[kept], bob_key[kept]
+    n = len(kept)
+    # error correction reveals about h(qber) bits per key bit, and privacy
+    # amplification removes as many again
+    if n * (1 - 2 * binary_entropy(min(estimated_qber, 0.5))) <= 0:
+        return PostProcessingResult(sifted_length, estimated_qber, estimated_qber, 0, 0, False, 0, empty, empty,
+                                    True, f"the estimated QBER of {estimated_qber:.2%} leaves no secret bits")
+
+    bob_key, corrected, leaked = cascade(alice_key, bob_key, estimated_qber, passes, rng)
+    qber = corrected / n
+
+    check_seed = rng.integers(0, 2, size=n + VERIFICATION_BITS - 1, dtype=np.uint8)
+    alice_check, bob_check = toeplitz_hash([alice_key, bob_key], check_seed, VERIFICATION_BITS)
+    verified = bool(np.array_equal(alice_check, bob_check))
+    leaked += VERIFICATION_BITS
+
+    if not verified:
+        return PostProcessingResult(sifted_length, estimated_qber, qber, corrected, leaked, verified, 0,
+                                    empty, empty, True, "the verification hashes differ")
+    length = secret_key_length(n, qber, leaked, epsilon)
+    if length == 0:
+        return PostProcessingResult(sifted_length, estimated_qber, qber, corrected, leaked, verified, 0,
+                                    empty, empty, True, "no secret bits are left")
+    hash_seed = rng.integers(0, 2, size=n + length - 1, dtype=np.uint8)
+    alice_secret, bob_secret = toeplitz_hash([alice_key, bob_key], hash_seed, length)
+    return PostProcessingResult(sifted_length, estimated_qber, qber, corrected, leaked, verified, length,
+                                alice_secret, bob_secret, False, None)
+
+
+if __name__ == "__main__":
+    import time
+
+    from bb84 import simulate_bb84
+
+    qubits = 4 * 10**6
+    settings = [
+        ("no spy, clean fiber", dict(spy_is_present=False)),
+        ("no spy, 3% depolarizing fiber", dict(spy_is_present=False, noise="depolarizing", noise_probability=0.06)),
+        ("spy on 10% of the qubits", dict(intercept_fraction=0.1)),
+        ("spy on every qubit", dict()),
+    ]
+    for name, options in settings:
+        start = time.perf_counter()
+        exchange = simulate_bb84(qubits, seed=7, **options)
+        alice_key, bob_key = sifted_keys(exchange)
+        result = postprocess(alice_key, bob_key, seed=8)
+        elapsed = time.perf_counter() - start
+        print(f"{name}:")
+        print(f"  sifted {result.sifted_length} bits, estimated QBER {result.estimated_qber:.4f}, "
+              f"corrected {result.corrected_errors} errors (QBER {result.qber:.4f})")
+        print(f"  revealed {result.leaked_bits} parity bits, keys verified: {result.verified}")
+        if result.secret_length:
+            print(f"  secret key: {result.secret_length} bits, keys equal: "
+                  f"{np.array_equal(result.alice_key, result.bob_key)}")
+        else:
+            print(f"  Caught a spy! The exchange is aborted: {result.reason}.")
+        print(f"  {qubits / elapsed:,.0f} qubits/s, {result.secret_length / elapsed:,.0f} secret bits/s end to end")
+        print()
@@ -0,0 +1,101 @@
+# Parameter sweep of the BB84 key exchange
+#
+# Quantum Spy Hunter.py looks at one setting at a time (spy_is_present and
+# spy_had are constants at the top of the script). sweep() runs
+# bb84.simulate_bb84 on every point of a grid of
+#   - key length (number of qubits sent),
+#   - share of the qubits the spy intercepts,
+#   - spy basis strategy ("z", "x" or "random"),
+#   - fiber noise model and probability (bit-flip or depolarizing),
+# spread over worker processes, and returns one SweepRow per grid point: a
+# tidy table that write_csv saves for plotting.
+#
+# Every grid point uses its own child of numpy.random.SeedSequence(seed), so
+# the table only depends on the seed, not on the number of workers.
+
+import csv
+import itertools
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from bb84 import simulate_bb84
+
+SweepRow = namedtuple("SweepRow", [
+    "key_length", "intercept_fraction", "spy_strategy", "noise", "noise_probability",
+    "sifted_length", "errors", "qber", "detection_probability", "detected",
+])
+
+
+def sweep_grid(key_lengths, intercept_fractions=(1.0,), spy_strategies=("x",),
+               noise_models=(None,), noise_probabilities=(0.0,)):
+    """
+    Return the grid points (key_length, intercept_fraction, spy_strategy,
+    noise, noise_probability), in the order of the sweep's rows. Noise
+    probabilities are only combined with noise models other than None.
+    """
+    grid = []
+    for key_length, fraction, strategy, noise in itertools.product(
+            key_lengths, intercept_fractions, spy_strategies, noise_models):
+        probabilities = noise_probabilities if noise is not None else (0.0,)
+        for probability in probabilities:
+            grid.append((key_length, fraction, strategy, noise, probability))
+    return grid
+
+
+def _run_point(point, sample_size, seed_sequence):
+    # runs inside a worker process; only the scalars travel back
+    key_length, fraction, strategy, noise, probability = point
+    result = simulate_bb84(key_length, spy_is_present=fraction > 0, sample_size=sample_size,
+                           seed=seed_sequence, intercept_fraction=fraction,
+                           spy_strategy=strategy, noise=noise, noise_probability=probability)
+    return SweepRow(key_length, fraction, strategy, noise, probability, result.sifted_length,
+                    result.errors, result.qber, result.detection_probability, result.detected)
+
+
+def sweep(key_lengths, intercept_fractions=(1.0,), spy_strategies=("x",), noise_models=(None,),
+          noise_probabilities=(0.0,), sample_size=None, seed=None, workers=None):
+    """
+    Simulate a key exchange at every point of sweep_grid(...) and return the
+    list of SweepRows. `sample_size` sifted bits are compared to detect the spy
+    (all of them by default). The points run on `workers` processes (all CPUs
+    by default, 1 runs them in this process).
+    """
+    grid = sweep_grid(key_lengths, intercept_fractions, spy_strategies, noise_models, noise_probabilities)
+    seeds = np.random.SeedSequence(seed).spawn(len(grid))
+    samples = [sample_size] * len(grid)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        return list(map(_run_point, grid, samples, seeds))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(grid) // (4 * workers))
+        return list(pool.map(_run_point, grid, samples, seeds, chunksize=chunksize))
+
+
+def write_csv(rows, path):
+    """
+    Save sweep rows to a CSV file with a header line.
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(SweepRow._fields)
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    rows = sweep(
+        key_lengths=[1000, 10000],
+        intercept_fractions=[0.0, 0.25, 0.5, 1.0],
+        spy_strategies=["z", "x", "random"],
+        noise_models=[None, "bitflip", "depolarizing"],
+        noise_probabilities=[0.02, 0.1],
+        sample_size=20,
+        seed=2024,
+    )
+    print(f"{'qubits':>7} {'spy':>5} {'basis':>7} {'noise':>13} {'p':>5} {'QBER':>7} {'detection':>10}")
+    for row in rows:
+        print(f"{row.key_length:>7} {row.intercept_fraction:>5} {row.spy_strategy:>7} {str(row.noise):>13} "
+              f"{row.noise_probability:>5} {row.qber:>7.4f} {row.detection_probability:>10.4f}")
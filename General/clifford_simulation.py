@@ -0,0 +1,317 @@
+# Stabilizer simulation of Clifford circuits
+#
+# Circuits built only from Clifford gates (H, S, X, Y, Z, CX, CZ, SWAP, ...)
+# never leave the set of stabilizer states, which a tableau of 2n Pauli
+# operators describes in O(n^2) bits instead of 2^n amplitudes
+# (qiskit.quantum_info.Clifford / StabilizerState).
+#
+# Measuring every qubit of a stabilizer state gives an outcome that is uniform
+# over an affine subspace x0 + span(G) of GF(2)^n: the rows of G are the X
+# parts of the stabilizers, and x0 meets the parity constraints of the
+# stabilizers that are products of Z operators only. stabilizer_outcomes finds
+# x0 and G by Gaussian elimination on the bit-packed tableau, after which any
+# number of shots costs one random bit per dimension of the subspace and a
+# GF(2) matrix product: a 4096-qubit random register is sampled in seconds.
+#
+# Circuits that measure or reset qubits halfway through, or use if_test, are
+# simulated shot by shot, still in polynomial time: every shot updates one
+# tableau in place, gate by gate, and measures it with the
+# Aaronson-Gottesman procedure.
+
+from collections import namedtuple
+
+import numpy as np
+from qiskit import QuantumCircuit
+from qiskit.circuit import ClassicalRegister, Clbit
+from qiskit.quantum_info import Clifford
+from qiskit.quantum_info.operators.symplectic.clifford_circuits import _append_operation
+
+# gates whose tableau update Clifford knows, by name
+CLIFFORD_GATES = {
+    "id", "i", "x", "y", "z", "h", "s", "sdg", "sx", "sxdg",
+    "cx", "CX", "cy", "cz", "swap", "iswap", "ecr", "dcx",
+}
+
+# instructions that do not change the quantum state
+_IGNORED = {"barrier", "delay", "global_phase"}
+
+# number of 1 bits in each byte value
+_ONES = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1).astype(np.int64)
+
+# Outcome distribution of measuring every qubit: uniform over
+# offset + span(rows of generators); pivots[i] is the column where row i of
+# generators is the only row with a 1 (so that outcome bit is uniform)
+AffineOutcomes = namedtuple("AffineOutcomes", ["offset", "generators", "pivots"])
+
+
+def is_clifford(circuit):
+    """
+    Return True if `circuit` only has Clifford gates, measurements, resets,
+    barriers and if_test blocks holding such instructions, conditioned on a
+    (clbit or register, value) pair.
+    """
+    for instruction in circuit.data:
+        name = instruction.operation.name
+        if name == "if_else":
+            condition = instruction.operation.condition
+            if not (isinstance(condition, tuple) and isinstance(condition[0], (Clbit, ClassicalRegister))):
+                # expr.Expr conditions are left to the general simulators
+                return False
+            if not all(body is None or is_clifford(body) for body in instruction.operation.params):
+                return False
+        elif name not in CLIFFORD_GATES and name not in _IGNORED and name not in ("measure", "reset"):
+            return False
+    return True
+
+
+def has_final_measurements_only(circuit):
+    """
+    Return True if `circuit` has no resets or if_test blocks and no gate
+    after a measurement.
+    """
+    measured = False
+    for instruction in circuit.data:
+        name = instruction.operation.name
+        if name in ("reset", "if_else"):
+            return False
+        if name == "measure":
+            measured = True
+        elif measured and name not in _IGNORED:
+            return False
+    return True
+
+
+def _bit(packed, column):
+    # column `column` of a bit-packed matrix, as 0/1 per row
+    return (packed[:, column >> 3] >> (7 - (column & 7))) & 1
+
+
+def _count_ones(rows):
+    # number of 1 bits in each row, bit-packed (uint8) or boolean
+    if rows.dtype == bool:
+        return rows.sum(axis=1)
+    return _ONES[rows].sum(axis=1)
+
+
+def _rowsum(x, z, phases, targets, source):
+    # multiply the Pauli rows `targets` by row `source` in place (the rowsum
+    # of Aaronson and Gottesman); g counts the powers of i of the product.
+    # The rows are bit-packed or boolean (the tableau of a Clifford)
+    x1, z1, x2, z2 = x[source], z[source], x[targets], z[targets]
+    plus = (x1 & z1 & z2 & ~x2) | (x1 & ~z1 & z2 & x2) | (~x1 & z1 & x2 & ~z2)
+    minus = (x1 & z1 & x2 & ~z2) | (x1 & ~z1 & z2 & ~x2) | (~x1 & z1 & x2 & z2)
+    g = _count_ones(plus) - _count_ones(minus)
+    phases[targets] = ((2 * phases[targets] + 2 * phases[source] + g) % 4) // 2
+    x[targets] ^= x1
+    z[targets] ^= z1
+
+
+def _swap_rows(arrays, i, j):
+    for array in arrays:
+        array[[i, j]] = array[[j, i]]
+
+
+def stabilizer_outcomes(clifford):
+    """
+    Return the AffineOutcomes of measuring every qubit of the stabilizer
+    state clifford|0...0> (`clifford` may also be a circuit without
+    measurements).
+    """
+    if not isinstance(clifford, Clifford):
+        clifford = Clifford(clifford)
+    n = clifford.num_qubits
+    x = np.packbits(clifford.stab_x, axis=1)
+    z = np.packbits(clifford.stab_z, axis=1)
+    phases = clifford.stab_phase.astype(np.int64)
+
+    # reduce the X parts to row echelon form, each pivot alone in its column;
+    # the rows left with no X part are the (signed) Z-only stabilizers
+    pivots = []
+    for column in range(n):
+        rows = np.flatnonzero(_bit(x, column))
+        rows = rows[rows >= len(pivots)]
+        if not len(rows):
+            continue
+        pivot = len(pivots)
+        _swap_rows((x, z, phases), pivot, rows[0])
+        others = np.flatnonzero(_bit(x, column))
+        others = others[others != pivot]
+        if len(others):
+            _rowsum(x, z, phases, others, pivot)
+        pivots.append(column)
+
+    # every Z-only stabilizer (-1)^r Z^v fixes the parity v . outcome = r;
+    # solve these equations by elimination for one particular outcome
+    k = len(pivots)
+    equations, parities = z[k:].copy(), phases[k:].copy()
+    columns = []
+    for column in range(n):
+        rows = np.flatnonzero(_bit(equations, column))
+        rows = rows[rows >= len(columns)]
+        if not len(rows):
+            continue
+        solved = len(columns)
+        _swap_rows((equations, parities), solved, rows[0])
+        others = np.flatnonzero(_bit(equations, column))
+        others = others[others != solved]
+        equations[others] ^= equations[solved]
+        parities[others] ^= parities[solved]
+        columns.append(column)
+    # with the free bits set to 0, each pivot bit equals its parity
+    offset = np.zeros(n, dtype=np.uint8)
+    offset[columns] = parities[:len(columns)]
+
+    generators = np.unpackbits(x[:k], axis=1, count=n)
+    return AffineOutcomes(offset, generators, np.array(pivots, dtype=np.int64))
+
+
+def sample_outcomes(outcomes, shots, qubits=None, rng=None):
+    """
+    Draw `shots` outcomes from AffineOutcomes as a (shots, len(qubits)) bit
+    matrix; column j is the outcome of qubits[j] (all qubits by default).
+    """
+    rng = np.random.default_rng(rng)
+    n = len(outcomes.offset)
+    qubits = np.arange(n) if qubits is None else np.asarray(qubits, dtype=np.int64)
+    k = len(outcomes.pivots)
+    bits = np.empty((shots, len(qubits)), dtype=np.uint8)
+    bits[:] = outcomes.offset[qubits]
+    if k == 0:
+        return bits
+
+    # a pivot column is one random bit; other columns are parities of them
+    row_of_pivot = dict(zip(outcomes.pivots.tolist(), range(k)))
+    direct = [(j, row_of_pivot[q]) for j, q in enumerate(qubits.tolist()) if q in row_of_pivot]
+    mixed = [j for j, q in enumerate(qubits.tolist()) if q not in row_of_pivot]
+    matrix = outcomes.generators[:, qubits[mixed]].astype(np.float32)
+    chunk = max(1, (1 << 24) // k)
+    for start in range(0, shots, chunk):
+        stop = min(shots, start + chunk)
+        random_bits = rng.integers(0, 2, size=(stop - start, k), dtype=np.uint8)
+        if direct:
+            columns, rows = zip(*direct)
+            bits[start:stop, list(columns)] ^= random_bits[:, list(rows)]
+        if mixed:
+            products = random_bits.astype(np.float32) @ matrix
+            bits[start:stop, mixed] ^= (products.astype(np.int64) & 1).astype(np.uint8)
+    return bits
+
+
+def sample_clifford(circuit, shots, seed=None):
+    """
+    Run a Clifford circuit for `shots` shots and return the classical memory
+    as a (shots, num_clbits) bit matrix, column j = clbit j.
+    """
+    if not is_clifford(circuit):
+        raise ValueError(f"circuit {circuit.name!r} has non-Clifford instructions")
+    rng = np.random.default_rng(seed)
+    if not has_final_measurements_only(circuit):
+        return _sample_shot_by_shot(circuit, shots, rng)
+
+    gates = circuit.copy_empty_like()
+    measurements = []
+    for instruction in circuit.data:
+        if instruction.operation.name == "measure":
+            measurements.append((circuit.find_bit(instruction.qubits[0]).index,
+                                 circuit.find_bit(instruction.clbits[0]).index))
+        elif instruction.operation.name not in _IGNORED:
+            gates.append(instruction)
+    memory = np.zeros((shots, circuit.num_clbits), dtype=np.uint8)
+    if measurements:
+        qubits, clbits = zip(*measurements)
+        outcomes = stabilizer_outcomes(Clifford(gates))
+        # a later measurement into the same clbit wins, as in the circuit
+        memory[:, list(clbits)] = sample_outcomes(outcomes, shots, list(qubits), rng)
+    return memory
+
+
+def _measure(clifford, qubit, rng):
+    # measure `qubit` of the stabilizer state clifford|0...0> and collapse
+    # the tableau in place (Aaronson and Gottesman); returns the outcome
+    n = clifford.num_qubits
+    x, z, phases = clifford.x, clifford.z, clifford.phase
+    anticommuting = np.flatnonzero(x[n:, qubit])
+    if len(anticommuting):
+        # random outcome: the first stabilizer that anticommutes with Z_qubit
+        # replaces its destabilizer and becomes +-Z_qubit
+        pivot = n + anticommuting[0]
+        targets = np.flatnonzero(x[:, qubit])
+        targets = targets[(targets != pivot) & (targets != pivot - n)]
+        if len(targets):
+            _rowsum(x, z, phases, targets, pivot)
+        clifford.tableau[pivot - n] = clifford.tableau[pivot]
+        clifford.tableau[pivot] = False
+        z[pivot, qubit] = True
+        outcome = int(rng.integers(2))
+        phases[pivot] = outcome
+        return outcome
+    # deterministic outcome: the sign of the product of the stabilizers whose
+    # destabilizers anticommute with Z_qubit, accumulated in a scratch row
+    scratch_x = np.zeros((2, n), dtype=bool)
+    scratch_z = np.zeros((2, n), dtype=bool)
+    scratch_phases = np.zeros(2, dtype=np.int64)
+    for row in n + np.flatnonzero(x[:n, qubit]):
+        scratch_x[1], scratch_z[1], scratch_phases[1] = x[row], z[row], phases[row]
+        _rowsum(scratch_x, scratch_z, scratch_phases, [0], 1)
+    return int(scratch_phases[0])
+
+
+def _compile(circuit, qubits, clbits):
+    # turn the instructions into (kind, ...) steps for _run_steps
+    steps = []
+    for instruction in circuit.data:
+        operation = instruction.operation
+        name = operation.name
+        targets = [qubits[bit] for bit in instruction.qubits]
+        if name in _IGNORED:
+            continue
+        if name == "measure":
+            steps.append(("measure", targets[0], clbits[instruction.clbits[0]]))
+        elif name == "reset":
+            steps.append(("reset", targets[0]))
+        elif name == "if_else":
+            target, value = operation.condition
+            bits = [target] if isinstance(target, Clbit) else list(target)
+            bodies = []
+            for body in operation.params:
+                if body is None:
+                    bodies.append([])
+                    continue
+                body_qubits = {bit: qubits[outer] for bit, outer in zip(body.qubits, instruction.qubits)}
+                body_clbits = {bit: clbits[outer] for bit, outer in zip(body.clbits, instruction.clbits)}
+                bodies.append(_compile(body, body_qubits, body_clbits))
+            steps.append(("if", [clbits[bit] for bit in bits], value, bodies[0], bodies[1]))
+        else:
+            steps.append(("gate", operation, targets))
+    return steps
+
+
+def _run_steps(steps, clifford, memory, rng):
+    # run the steps on `clifford` in place and return the classical memory
+    for step in steps:
+        kind = step[0]
+        if kind == "gate":
+            _append_operation(clifford, step[1], step[2])
+        elif kind == "measure":
+            outcome = _measure(clifford, step[1], rng)
+            memory = memory & ~(1 << step[2]) | outcome << step[2]
+        elif kind == "reset":
+            if _measure(clifford, step[1], rng):
+                _append_operation(clifford, "x", [step[1]])
+        else:
+            _, positions, value, true_steps, false_steps = step
+            register = sum(((memory >> position) & 1) << i for i, position in enumerate(positions))
+            memory = _run_steps(true_steps if register == value else false_steps, clifford, memory, rng)
+    return memory
+
+
+def _sample_shot_by_shot(circuit, shots, rng):
+    qubits = {bit: circuit.find_bit(bit).index for bit in circuit.qubits}
+    clbits = {bit: circuit.find_bit(bit).index for bit in circuit.clbits}
+    steps = _compile(circuit, qubits, clbits)
+    initial = Clifford(QuantumCircuit(circuit.num_qubits))
+    memory = np.zeros((shots, circuit.num_clbits), dtype=np.uint8)
+    for shot in range(shots):
+        value = _run_steps(steps, initial.copy(), 0, rng)
+        memory[shot] = [(value >> clbit) & 1 for clbit in range(circuit.num_clbits)]
+    return memory
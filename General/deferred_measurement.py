@@ -0,0 +1,268 @@
+# Deferred-measurement rewriting of classically controlled circuits
+#
+# By the principle of deferred measurement, measuring a qubit halfway through
+# a circuit and conditioning later gates on the result gives the same outcome
+# distribution as copying the qubit onto a fresh ancilla with a CX, using the
+# ancilla as the control of those gates and measuring it at the end.
+# defer_measurements() rewrites a circuit this way:
+#   - a measurement whose qubit or result is still used later becomes a CX
+#     onto an ancilla, which is measured into the same clbit at the end,
+#   - an if_test block becomes its gates controlled on the ancillas holding the
+#     condition's clbits (a flag ancilla computes conditions on several bits),
+#   - a reset swaps the qubit with a fresh ancilla in |0>,
+#   - measurements that are already final stay on their qubit.
+# Qubits known to be |0> or to equal an ancilla need no extra ancilla: their
+# resets are dropped or undone with a CX.
+#
+# The result has no resets, no if_test blocks and only final measurements, so
+# a simulator runs it once and samples every shot from the final state.
+# check_deferred() compares the exact outcome distributions of both circuits.
+
+import numpy as np
+from qiskit.circuit import AncillaRegister, Clbit, ControlFlowOp, Gate
+from qiskit.circuit.library import CXGate, MCXGate, SwapGate, XGate
+from qiskit.quantum_info import Statevector
+
+from branching_simulator import BranchingSimulator
+
+
+def _final_measurements(instructions):
+    # indices of the measurements whose qubit is not used afterwards and
+    # whose clbit is neither read by a condition nor written again
+    used_qubits, used_clbits = set(), set()
+    final = set()
+    for index in range(len(instructions) - 1, -1, -1):
+        instruction = instructions[index]
+        if instruction.operation.name == "barrier":
+            continue
+        if instruction.operation.name == "measure":
+            qubit, clbit = instruction.qubits[0], instruction.clbits[0]
+            if qubit not in used_qubits and clbit not in used_clbits:
+                final.add(index)
+        used_qubits.update(instruction.qubits)
+        used_clbits.update(instruction.clbits)
+    return final
+
+
+class _Deferrer:
+    # state of one rewrite: instructions of the new circuit as
+    # (operation, qubit indices), indices >= num_qubits being ancillas
+
+    def __init__(self, circuit):
+        self.circuit = circuit
+        self.instructions = []
+        self.ancillas = 0
+        self.fresh = set(range(circuit.num_qubits))  # qubits known to be |0>
+        self.copies = {}       # clbit -> ancilla holding its value (absent: 0)
+        self.classical = {}    # measured qubit -> ancilla it still equals
+        self.final = []        # (qubit, clbit) measured directly at the end
+
+    def new_ancilla(self):
+        self.ancillas += 1
+        return self.circuit.num_qubits + self.ancillas - 1
+
+    def append(self, operation, qubits):
+        self.instructions.append((operation, list(qubits)))
+
+    def touch(self, qubits):
+        for qubit in qubits:
+            self.fresh.discard(qubit)
+            self.classical.pop(qubit, None)
+
+    def measure(self, qubit, clbit):
+        if qubit in self.fresh:
+            self.copies.pop(clbit, None)
+        elif qubit in self.classical:
+            self.copies[clbit] = self.classical[qubit]
+        else:
+            ancilla = self.new_ancilla()
+            self.append(CXGate(), [qubit, ancilla])
+            self.copies[clbit] = self.classical[qubit] = ancilla
+
+    def reset(self, qubit):
+        if qubit in self.fresh:
+            return
+        if qubit in self.classical:
+            self.append(CXGate(), [self.classical.pop(qubit), qubit])
+        else:
+            self.append(SwapGate(), [qubit, self.new_ancilla()])
+        self.fresh.add(qubit)
+
+    def if_else(self, instruction, qubits, clbits):
+        condition = instruction.operation.condition
+        if not isinstance(condition, tuple):
+            raise ValueError("only (clbit or register, value) conditions can be deferred")
+        target, value = condition
+        bits = [target] if isinstance(target, Clbit) else list(target)
+        wanted_states = {}     # ancilla -> state it must be in
+        controls = []
+        for i, bit in enumerate(bits):
+            wanted = (value >> i) & 1
+            ancilla = self.copies.get(clbits[bit])
+            if ancilla is None and not wanted:
+                continue
+            if ancilla is None or wanted_states.setdefault(ancilla, wanted) != wanted:
+                # the clbit is still 0, or two clbits holding the same copy
+                # must differ: the condition can never hold
+                controls = None
+                break
+        if controls is not None:
+            controls, states = list(wanted_states), list(wanted_states.values())
+
+        true_body, false_body = instruction.operation.params
+        if controls == []:
+            self.body(true_body, instruction, qubits)
+            return
+        if controls is None:
+            if false_body is not None:
+                self.body(false_body, instruction, qubits)
+            return
+
+        if len(controls) == 1:
+            control, state = controls[0], states[0]
+        else:
+            # flag = 1 exactly when every control is in its wanted state
+            control, state = self.new_ancilla(), 1
+            self.controlled(MCXGate(len(controls)), controls, states, [control])
+        self.body(true_body, instruction, qubits, control, state)
+        if false_body is not None:
+            self.body(false_body, instruction, qubits, control, 1 - state)
+
+    def body(self, body, instruction, qubits, control=None, state=1):
+        # body bits stand for the if_test instruction's bits, in order
+        body_qubits = {bit: qubits[outer] for bit, outer in zip(body.qubits, instruction.qubits)}
+        for inner in body.data:
+            name = inner.operation.name
+            if name == "barrier":
+                continue
+            if not isinstance(inner.operation, Gate):
+                raise ValueError(f"cannot defer a {name!r} inside an if_test block")
+            targets = [body_qubits[bit] for bit in inner.qubits]
+            self.touch(targets)
+            if control is None:
+                self.append(inner.operation, targets)
+            else:
+                self.controlled(inner.operation.control(1), [control], [state], targets)
+
+    def controlled(self, gate, controls, states, targets):
+        # controls in state 0 are flipped around the gate, so the gate keeps
+        # its standard name (cx, ch, ccx, ...)
+        flipped = [control for control, wanted in zip(controls, states) if not wanted]
+        for control in flipped:
+            self.append(XGate(), [control])
+        self.append(gate, controls + targets)
+        for control in flipped:
+            self.append(XGate(), [control])
+
+
+def defer_measurements(circuit):
+    """
+    Return a circuit with the same outcome distribution as `circuit` but
+    without resets or if_test blocks and with every measurement at the end.
+    The extra qubits are in an ancilla register named "deferred".
+    Supports measurements, resets, gates and if_test blocks (with an optional
+    else) holding gates, on (clbit or register, value) conditions.
+    """
+    state = _Deferrer(circuit)
+    qubits = {bit: circuit.find_bit(bit).index for bit in circuit.qubits}
+    clbits = {bit: circuit.find_bit(bit).index for bit in circuit.clbits}
+    final = _final_measurements(circuit.data)
+
+    for index, instruction in enumerate(circuit.data):
+        name = instruction.operation.name
+        targets = [qubits[bit] for bit in instruction.qubits]
+        if name == "measure":
+            clbit = clbits[instruction.clbits[0]]
+            if index in final:
+                state.copies.pop(clbit, None)
+                state.final.append((targets[0], clbit))
+            else:
+                state.measure(targets[0], clbit)
+        elif name == "reset":
+            state.reset(targets[0])
+        elif name == "if_else":
+            state.if_else(instruction, qubits, clbits)
+        elif name == "barrier":
+            state.append(instruction.operation, targets)
+        elif isinstance(instruction.operation, ControlFlowOp):
+            raise ValueError(f"cannot defer measurements around a {name!r} block")
+        else:
+            state.touch(targets)
+            state.append(instruction.operation, targets)
+
+    deferred = circuit.copy_empty_like()
+    if state.ancillas:
+        deferred.add_register(AncillaRegister(state.ancillas, "deferred"))
+    for operation, targets in state.instructions:
+        deferred.append(operation, [deferred.qubits[qubit] for qubit in targets])
+    for clbit, ancilla in sorted(state.copies.items()):
+        deferred.measure(deferred.qubits[ancilla], deferred.clbits[clbit])
+    for qubit, clbit in state.final:
+        deferred.measure(deferred.qubits[qubit], deferred.clbits[clbit])
+    return deferred
+
+
+def outcome_distribution(circuit):
+    """
+    Return {classical memory bitstring: probability} for a circuit whose
+    measurements all come at the end (e.g. one from defer_measurements), from
+    a single statevector; bitstrings are formatted as in
+    BranchingSimulator.branch_distribution.
+    """
+    unitary_part = circuit.copy_empty_like()
+    measurements = []
+    for instruction in circuit.data:
+        if instruction.operation.name == "measure":
+            measurements.append((circuit.find_bit(instruction.qubits[0]).index,
+                                 circuit.find_bit(instruction.clbits[0]).index))
+        elif measurements and instruction.operation.name != "barrier":
+            raise ValueError("all measurements must come at the end of the circuit")
+        else:
+            unitary_part.append(instruction)
+    if not measurements:
+        return {"0" * circuit.num_clbits: 1.0}
+
+    measured = sorted({qubit for qubit, _ in measurements})
+    probabilities = Statevector(unitary_part).probabilities(measured)
+    distribution = {}
+    for outcome in np.flatnonzero(probabilities > 1e-12):
+        memory = 0
+        for qubit, clbit in measurements:
+            bit = (outcome >> measured.index(qubit)) & 1
+            memory = memory & ~(1 << clbit) | bit << clbit
+        key = format(memory, f"0{circuit.num_clbits}b")
+        distribution[key] = distribution.get(key, 0.0) + float(probabilities[outcome])
+    return distribution
+
+
+def check_deferred(circuit, deferred=None):
+    """
+    Return the largest difference between the outcome probabilities of
+    `circuit` (explored branch by branch) and of its deferred version
+    (defer_measurements(circuit) by default); ~1e-12 means they agree.
+    """
+    if deferred is None:
+        deferred = defer_measurements(circuit)
+    original = BranchingSimulator().branch_distribution(circuit)
+    rewritten = outcome_distribution(deferred)
+    return max(abs(original.get(key, 0.0) - rewritten.get(key, 0.0)) for key in set(original) | set(rewritten))
+
+
+if __name__ == "__main__":
+    import time
+
+    from qiskit.providers.basic_provider import BasicSimulator
+
+    from bb84 import bb84_circuit
+
+    circuit = bb84_circuit(spy_is_present=True, spy_had=True)
+    deferred = defer_measurements(circuit)
+    print(f"BB84 circuit: {circuit.num_qubits} qubits, {len(circuit.data)} instructions")
+    print(f"deferred:     {deferred.num_qubits} qubits, {len(deferred.data)} instructions, "
+          f"largest probability difference {check_deferred(circuit, deferred):.2e}")
+    print(deferred.draw(output='text', fold=120))
+
+    shots = 10**5
+    start = time.perf_counter()
+    BasicSimulator().run(deferred, shots=shots, seed_simulator=1).result().get_counts()
+    print(f"BasicSimulator, {shots} shots of the deferred circuit: {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,127 @@
+# Vectorized decoding of measurement results
+#
+# Qiskit returns per-shot memory and counts as bitstrings such as
+# "1 0 1 1 0": one group per classical register, last register first, each
+# register most significant bit first. Decoding them one at a time with
+# int(bits, 2) or key.split(' ') costs a Python call per shot. Here all the
+# strings are joined and read as one byte buffer, giving in a single NumPy step
+#   - a bit matrix with one row per shot and column j holding classical bit j,
+#   - packed integers for the whole classical state or for each register.
+# bits_to_hex goes the other way, for simulators that sample bit matrices.
+
+import numpy as np
+
+_UNSIGNED_TYPES = [np.uint8, np.uint16, np.uint32, np.uint64]
+
+
+def memory_to_bits(memory):
+    """
+    Convert a list of equal-length bitstrings (per-shot memory or counts keys)
+    into a uint8 matrix of shape (shots, classical bits); column j is
+    classical bit j. Spaces between registers are dropped.
+    """
+    shots = len(memory)
+    if shots == 0:
+        return np.zeros((0, 0), dtype=np.uint8)
+    length = len(memory[0])
+    characters = np.frombuffer("".join(memory).encode("ascii"), dtype=np.uint8)
+    if characters.size != shots * length:
+        raise ValueError("all bitstrings must have the same length")
+    characters = characters.reshape(shots, length)
+
+    # the spaces are in the same columns for every shot
+    keep = characters[0] != ord(" ")
+    bits = characters[:, keep] - ord("0")
+    if bits.size and bits.max() > 1:
+        raise ValueError("bitstrings may only contain '0', '1' and spaces")
+    return bits[:, ::-1]
+
+
+def pack_bits(bits, dtype=None):
+    """
+    Pack a (shots, n) bit matrix (column j = bit j) into one unsigned integer
+    per shot. `dtype` defaults to the smallest of uint8 ... uint64 that fits.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    width = bits.shape[1]
+    if dtype is None:
+        if width > 64:
+            raise ValueError(f"cannot pack {width} bits into one integer, the limit is 64")
+        dtype = next(t for t in _UNSIGNED_TYPES if 8 * np.dtype(t).itemsize >= width)
+    dtype = np.dtype(dtype)
+    if width > 8 * dtype.itemsize:
+        raise ValueError(f"{width} bits do not fit in {dtype}")
+
+    # most significant bit first, padded on the left to whole bytes of dtype
+    padded = np.zeros((bits.shape[0], 8 * dtype.itemsize), dtype=np.uint8)
+    padded[:, padded.shape[1] - width:] = bits[:, ::-1]
+    packed = np.packbits(padded, axis=1)
+    return packed.view(dtype.newbyteorder(">")).reshape(-1).astype(dtype)
+
+
+def register_layout(circuit):
+    """
+    Return [(register name, first classical bit, size), ...] for the classical
+    registers of `circuit`, in the circuit's order.
+    """
+    return [(creg.name, circuit.find_bit(creg[0]).index, creg.size) for creg in circuit.cregs if creg.size]
+
+
+def register_columns(bits, circuit):
+    """
+    Split a bit matrix from memory_to_bits into one packed integer array per
+    classical register of `circuit`, as a dict {register name: values}.
+    """
+    return {
+        name: pack_bits(bits[:, start:start + size])
+        for name, start, size in register_layout(circuit)
+    }
+
+
+def memory_to_integers(memory, dtype=None):
+    """
+    Decode per-shot memory into one packed integer per shot (the whole
+    classical state, bit j of the integer = classical bit j).
+    """
+    return pack_bits(memory_to_bits(memory), dtype)
+
+
+def memory_to_columns(memory, circuit):
+    """
+    Decode per-shot memory into {register name: one integer per shot}.
+    """
+    return register_columns(memory_to_bits(memory), circuit)
+
+
+def counts_to_arrays(counts, dtype=None):
+    """
+    Convert a counts dict into (outcomes, counts): the packed classical state
+    of every distinct outcome and how many times it was seen.
+    """
+    keys = list(counts)
+    return memory_to_integers(keys, dtype), np.fromiter(counts.values(), dtype=np.int64, count=len(keys))
+
+
+def counts_to_columns(counts, circuit):
+    """
+    Convert a counts dict into ({register name: value of every outcome}, counts).
+    """
+    keys = list(counts)
+    return memory_to_columns(keys, circuit), np.fromiter(counts.values(), dtype=np.int64, count=len(keys))
+
+
+def bits_to_hex(bits):
+    """
+    Inverse of memory_to_bits for simulator results: return (outcomes, index)
+    where outcomes holds the distinct rows of the bit matrix as hex strings
+    ('0x...', the format of BasicSimulator memory) and outcomes[index] gives
+    one string per shot.
+    """
+    bits = np.asarray(bits, dtype=np.uint8)
+    shots, width = bits.shape
+    # most significant bit first, padded on the left to whole bytes
+    padded = np.zeros((shots, -(-width // 8) * 8), dtype=np.uint8)
+    padded[:, padded.shape[1] - width:] = bits[:, ::-1]
+    rows, index = np.unique(np.packbits(padded, axis=1), axis=0, return_inverse=True)
+    outcomes = np.array([hex(int.from_bytes(row.tobytes(), "big")) for row in rows])
+    return outcomes, index.reshape(-1)
@@ -0,0 +1,177 @@
+# Product-state simulation with lazy merging of factors
+#
+# A statevector of n qubits has 2^n amplitudes even when the qubits are not
+# entangled at all, as in Separable Qubits.py. ProductState keeps the state as
+# a product of independent factors, each the statevector of a group of qubits;
+# every qubit starts in a factor of its own. A gate on qubits of different
+# factors first merges them into one (their tensor product), so memory stays
+# 2 amplitudes per qubit for unentangled circuits and 2^k for the largest
+# group of k qubits that gates have joined.
+#
+# Measuring is done factor by factor: the factors are independent, so each one
+# samples its own qubits for every shot.
+
+from collections import namedtuple
+
+import numpy as np
+
+from branching_simulator import gate_matrix
+
+# instructions that do not change the quantum state
+_IGNORED = {"id", "u0", "delay", "barrier"}
+
+# A group of qubits and their statevector: a tensor with one axis of size 2
+# per qubit, axis i belonging to qubits[i]
+Factor = namedtuple("Factor", ["qubits", "statevector"])
+
+
+class ProductState:
+    """
+    State of `num_qubits` qubits, initially |0...0>, stored as a product of
+    independent factors that are merged only when a gate acts on several of them.
+    """
+
+    def __init__(self, num_qubits):
+        self.num_qubits = num_qubits
+        self._factors = {qubit: Factor((qubit,), np.array([1, 0], dtype=complex)) for qubit in range(num_qubits)}
+        self._factor_of = list(range(num_qubits))   # qubit -> key of its factor
+
+    @property
+    def factors(self):
+        """
+        The current Factors, each with its qubits and their statevector.
+        """
+        return list(self._factors.values())
+
+    @property
+    def num_amplitudes(self):
+        """
+        Number of amplitudes stored, 2 per qubit for a fully separable state.
+        """
+        return sum(factor.statevector.size for factor in self._factors.values())
+
+    def _merge(self, qubits):
+        # join the factors of `qubits` into one and return its key
+        keys = list(dict.fromkeys(self._factor_of[qubit] for qubit in qubits))
+        key = keys[0]
+        for other in keys[1:]:
+            first, second = self._factors[key], self._factors.pop(other)
+            self._factors[key] = Factor(first.qubits + second.qubits,
+                                        np.multiply.outer(first.statevector, second.statevector))
+            for qubit in second.qubits:
+                self._factor_of[qubit] = key
+        return key
+
+    def apply(self, gate, qubits):
+        """
+        Apply the unitary `gate` (a 2^k x 2^k matrix in Qiskit's qubit order)
+        to `qubits`, merging their factors if needed.
+        """
+        key = self._merge(qubits)
+        factor = self._factors[key]
+        k = len(qubits)
+        # the matrix index of the gate has qubits[-1] as its most significant bit
+        axes = [factor.qubits.index(qubit) for qubit in reversed(qubits)]
+        tensor = np.reshape(np.asarray(gate, dtype=complex), [2] * (2 * k))
+        statevector = np.tensordot(tensor, factor.statevector, axes=(list(range(k, 2 * k)), axes))
+        self._factors[key] = factor._replace(statevector=np.moveaxis(statevector, list(range(k)), axes))
+
+    def apply_phase(self, phase):
+        """
+        Multiply the state by the global phase exp(i phase).
+        """
+        key = next(iter(self._factors))
+        self._factors[key] = self._factors[key]._replace(statevector=self._factors[key].statevector
+                                                         * np.exp(1j * phase))
+
+    def sample(self, qubits, shots, rng=None):
+        """
+        Draw `shots` measurements of `qubits` as a (shots, len(qubits)) bit
+        matrix, column j holding the outcome of qubits[j].
+        """
+        rng = np.random.default_rng(rng)
+        bits = np.zeros((shots, len(qubits)), dtype=np.uint8)
+        columns = {}
+        for column, qubit in enumerate(qubits):
+            columns.setdefault(self._factor_of[qubit], []).append((column, qubit))
+        for key, wanted in columns.items():
+            factor = self._factors[key]
+            probabilities = np.abs(factor.statevector.reshape(-1)) ** 2
+            outcomes = rng.choice(probabilities.size, size=shots, p=probabilities / probabilities.sum())
+            k = len(factor.qubits)
+            for column, qubit in wanted:
+                # axis i of the factor is bit k - 1 - i of the flattened index
+                bits[:, column] = (outcomes >> (k - 1 - factor.qubits.index(qubit))) & 1
+        return bits
+
+    def statevector(self):
+        """
+        Return the full 2^n statevector (qubit 0 least significant, as in
+        qiskit.quantum_info.Statevector). Only for small numbers of qubits.
+        """
+        qubits, tensor = (), np.ones(())
+        for factor in self._factors.values():
+            qubits += factor.qubits
+            tensor = np.multiply.outer(tensor, factor.statevector)
+        order = [qubits.index(qubit) for qubit in reversed(range(self.num_qubits))]
+        return np.transpose(tensor, order).reshape(-1)
+
+
+def factor_sizes(circuit):
+    """
+    Return the sizes of the groups of qubits that the multi-qubit gates of
+    `circuit` join, largest first: the factors ProductState ends up with.
+    """
+    group = list(range(circuit.num_qubits))
+
+    def find(qubit):
+        while group[qubit] != qubit:
+            group[qubit] = group[group[qubit]]
+            qubit = group[qubit]
+        return qubit
+
+    for instruction in circuit.data:
+        if instruction.operation.name in _IGNORED or instruction.operation.name == "measure":
+            continue
+        qubits = [find(circuit.find_bit(bit).index) for bit in instruction.qubits]
+        for qubit in qubits[1:]:
+            group[qubit] = qubits[0]
+    sizes = np.bincount([find(qubit) for qubit in range(circuit.num_qubits)])
+    return sorted(sizes[sizes > 0].tolist(), reverse=True)
+
+
+def simulate_product_state(circuit):
+    """
+    Return the ProductState reached by the gates of `circuit`; its
+    measurements are ignored, other non-gate instructions are refused.
+    """
+    state = ProductState(circuit.num_qubits)
+    state.apply_phase(circuit.global_phase)
+    for instruction in circuit.data:
+        operation = instruction.operation
+        if operation.name in _IGNORED or operation.name == "measure":
+            continue
+        if operation.name == "global_phase":
+            state.apply_phase(operation.params[0])
+            continue
+        gate = gate_matrix(operation)
+        if gate is None:
+            raise ValueError(f"the product-state simulation cannot apply {operation.name!r}")
+        state.apply(gate, [circuit.find_bit(bit).index for bit in instruction.qubits])
+    return state
+
+
+def sample_product_state(circuit, shots, seed=None):
+    """
+    Run a circuit whose measurements all come at the end for `shots` shots
+    and return the classical memory as a (shots, num_clbits) bit matrix,
+    column j = clbit j.
+    """
+    state = simulate_product_state(circuit)
+    measurements = [(circuit.find_bit(instruction.qubits[0]).index, circuit.find_bit(instruction.clbits[0]).index)
+                    for instruction in circuit.data if instruction.operation.name == "measure"]
+    memory = np.zeros((shots, circuit.num_clbits), dtype=np.uint8)
+    if measurements:
+        qubits, clbits = zip(*measurements)
+        memory[:, list(clbits)] = state.sample(list(qubits), shots, seed)
+    return memory
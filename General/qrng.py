@@ -0,0 +1,223 @@
+# Bulk quantum random byte generation
+#
+# Single Byte.py builds, transpiles and runs its 8-qubit Hadamard circuit once
+# per byte. Here the circuit is built and transpiled once, and a single job
+# with per-shot memory returns all the requested bytes at once. The register
+# width is configurable: a 32- or 64-qubit register gives 4 or 8 bytes per
+# shot, and random_words returns uint16/uint32/uint64 words directly.
+#
+# QuantumRandomStream serves bytes continuously from a ring buffer that a
+# background thread keeps filled with large random_bytes batches, so a reader
+# only waits for a simulator job when it drains the whole buffer.
+
+import threading
+from functools import lru_cache
+
+import numpy as np
+from qiskit import QuantumCircuit, QuantumRegister, ClassicalRegister, transpile
+from qiskit_aer import AerSimulator
+
+from measurement_decoding import memory_to_bits
+
+# qubits measured per shot by random_bytes
+DEFAULT_WIDTH = 32
+
+
+def random_word_circuit(width=8):
+    """
+    Return the circuit of Single Byte.py with `width` qubits instead of 8:
+    a Hadamard on every qubit, then a measurement of every qubit.
+    """
+    qreg = QuantumRegister(width, 'q')
+    creg = ClassicalRegister(width, 'c')
+    qc = QuantumCircuit(qreg, creg)
+    qc.h(qreg)
+    qc.measure(qreg, creg)
+    return qc
+
+
+@lru_cache(maxsize=None)
+def _simulator():
+    # the circuit only has Hadamards and measurements, so the stabilizer method
+    # simulates it for any width (the statevector method stops at ~30 qubits)
+    return AerSimulator(method="stabilizer")
+
+
+@lru_cache(maxsize=None)
+def compiled_word_circuit(width=8):
+    """
+    Return the `width`-qubit circuit transpiled for the simulator (built only
+    once per width).
+    """
+    return transpile(random_word_circuit(width), _simulator())
+
+
+def random_words(n, dtype=np.uint8, width=None, seed=None):
+    """
+    Return `n` random words of the unsigned integer type `dtype` (uint8 ...
+    uint64) from a single simulator job.
+
+    Every shot measures a register of `width` qubits (by default the size of
+    one word); `width` may be any multiple of the word size, and every shot
+    then gives width / word size words, so wider registers need fewer shots.
+    The words are packed straight from the measured bits, most significant
+    bit first. `seed` fixes the simulator's seed for reproducible output.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind != "u":
+        raise ValueError(f"dtype must be an unsigned integer type, got {dtype}")
+    word_bits = 8 * dtype.itemsize
+    if width is None:
+        width = word_bits
+    if width <= 0 or width % word_bits:
+        raise ValueError(f"register width must be a positive multiple of {word_bits} bits, got {width}")
+    if n < 0:
+        raise ValueError(f"number of words must be non-negative, got {n}")
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+
+    words_per_shot = width // word_bits
+    shots = -(-n // words_per_shot)
+    circuit = compiled_word_circuit(width)
+    job = _simulator().run(circuit, shots=shots, memory=True, seed_simulator=seed)
+    memory = job.result().get_memory(circuit)
+
+    # pack every shot most significant bit first, then cut it into words
+    bits = memory_to_bits(memory)
+    packed = np.packbits(bits[:, ::-1], axis=1).reshape(-1)
+    return packed.view(dtype.newbyteorder(">"))[:n].astype(dtype)
+
+
+def random_bytes(n, seed=None, width=DEFAULT_WIDTH):
+    """
+    Return `n` random bytes as a NumPy uint8 array, using a single simulator job.
+    Every shot measures `width` qubits (a multiple of 8), i.e. gives width / 8 bytes.
+    `seed` fixes the simulator's seed for reproducible output.
+    """
+    return random_words(n, np.uint8, width, seed)
+
+
+def job_seeds(seed=None):
+    """
+    Yield one simulator seed per job: None forever if `seed` is None, otherwise
+    a reproducible sequence of independent seeds derived from `seed`.
+    """
+    if seed is None:
+        while True:
+            yield None
+    seeds = np.random.SeedSequence(seed)
+    while True:
+        yield int(seeds.spawn(1)[0].generate_state(1)[0])
+
+
+class QuantumRandomStream:
+    """
+    Stream of quantum random bytes with a read(n) file-like interface; iterating
+    over it yields one byte value (0-255) at a time.
+
+    A background thread pre-fills a ring buffer of `buffer_size` bytes and
+    tops it up with batches of `refill_size` bytes (one simulator job each)
+    whenever that much space is free. Use it as a context manager, or call
+    close() to stop the thread.
+    """
+
+    def __init__(self, buffer_size=1 << 20, refill_size=None, seed=None):
+        if refill_size is None:
+            refill_size = max(buffer_size // 4, 1)
+        if buffer_size <= 0 or not 0 < refill_size <= buffer_size:
+            raise ValueError("need 0 < refill_size <= buffer_size")
+        self.buffer_size = buffer_size
+        self.refill_size = refill_size
+
+        self._buffer = np.zeros(buffer_size, dtype=np.uint8)
+        self._start = 0        # position of the oldest unread byte
+        self._available = 0    # number of unread bytes
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+
+        # every refill job gets its own simulator seed when a seed is given
+        self._seeds = job_seeds(seed)
+
+        self._thread = threading.Thread(target=self._refill, name="qrng-refill", daemon=True)
+        self._thread.start()
+
+    def _refill(self):
+        try:
+            while True:
+                with self._condition:
+                    self._condition.wait_for(
+                        lambda: self._closed or self.buffer_size - self._available >= self.refill_size
+                    )
+                    if self._closed:
+                        return
+                chunk = random_bytes(self.refill_size, seed=next(self._seeds))
+                with self._condition:
+                    end = (self._start + self._available) % self.buffer_size
+                    first = min(len(chunk), self.buffer_size - end)
+                    self._buffer[end:end + first] = chunk[:first]
+                    self._buffer[:len(chunk) - first] = chunk[first:]
+                    self._available += len(chunk)
+                    self._condition.notify_all()
+        except Exception as error:
+            with self._condition:
+                self._error = error
+                self._condition.notify_all()
+
+    def readinto(self, b):
+        """
+        Fill the writable buffer `b` with random bytes and return its length.
+        Blocks only while the ring buffer is empty.
+        """
+        target = np.frombuffer(memoryview(b).cast("B"), dtype=np.uint8)
+        filled = 0
+        with self._condition:
+            while filled < len(target):
+                self._condition.wait_for(lambda: self._available or self._closed or self._error)
+                if self._error is not None:
+                    raise RuntimeError("quantum random byte generation failed") from self._error
+                if self._closed:
+                    raise ValueError("read from a closed QuantumRandomStream")
+                size = min(self._available, len(target) - filled, self.buffer_size - self._start)
+                target[filled:filled + size] = self._buffer[self._start:self._start + size]
+                filled += size
+                self._start = (self._start + size) % self.buffer_size
+                self._available -= size
+                self._condition.notify_all()
+        return filled
+
+    def read(self, n):
+        """
+        Return `n` random bytes.
+        """
+        if n < 0:
+            raise ValueError(f"number of bytes must be non-negative, got {n}")
+        data = bytearray(n)
+        self.readinto(data)
+        return bytes(data)
+
+    def readable(self):
+        return True
+
+    def __iter__(self):
+        while True:
+            yield self.read(1)[0]
+
+    def close(self):
+        """
+        Stop the background thread. Reading afterwards raises ValueError.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,178 @@
+# Asyncio quantum random byte service with request coalescing
+#
+# Clients connect over TCP (localhost by default) or a Unix socket and send one
+# request per line: the number of random bytes they want. The service answers
+# every request with exactly that many raw bytes.
+#
+# Concurrent requests are not run as separate simulator jobs: they are queued,
+# and every job generates the bytes of all requests waiting at that moment in a
+# single qrng.random_bytes call, then splits the result between them. While a
+# job runs, new requests pile up and are served together by the next job.
+
+import asyncio
+from collections import deque
+from functools import partial
+
+from qrng import job_seeds, random_bytes
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# largest number of bytes a single request may ask for
+MAX_REQUEST_BYTES = 1 << 20
+
+
+class CoalescingGenerator:
+    """
+    Serve `await get(n)` calls from shared simulator jobs.
+
+    A job collects the waiting requests (after waiting `window` seconds for
+    more to arrive) until they add up to `max_job_bytes`, runs one
+    random_bytes job for all of them in a worker thread and hands every
+    request its own slice of the result.
+    """
+
+    def __init__(self, window=0.002, max_job_bytes=1 << 22, seed=None):
+        self.window = window
+        self.max_job_bytes = max_job_bytes
+        self.jobs = 0          # number of simulator jobs run so far
+        self.requests = 0      # number of requests served so far
+        self._seeds = job_seeds(seed)
+        self._pending = deque()
+        self._wakeup = None
+        self._task = None
+
+    async def get(self, n):
+        """
+        Return `n` random bytes.
+        """
+        if not 0 <= n <= MAX_REQUEST_BYTES:
+            raise ValueError(f"number of bytes must be between 0 and {MAX_REQUEST_BYTES}, got {n}")
+        if n == 0:
+            return b""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((n, future))
+        self._wakeup.set()
+        return await future
+
+    def _take_batch(self):
+        batch, total = [], 0
+        while self._pending and (not batch or total + self._pending[0][0] <= self.max_job_bytes):
+            n, future = self._pending.popleft()
+            if future.cancelled():
+                continue
+            batch.append((n, future))
+            total += n
+        return batch, total
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            if self.window:
+                await asyncio.sleep(self.window)
+            batch, total = self._take_batch()
+            if not self._pending:
+                self._wakeup.clear()
+            if not batch:
+                continue
+            try:
+                data = await loop.run_in_executor(None, random_bytes, total, next(self._seeds))
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+            self.jobs += 1
+            self.requests += len(batch)
+            data = data.tobytes()
+            offset = 0
+            for n, future in batch:
+                if not future.done():
+                    future.set_result(data[offset:offset + n])
+                offset += n
+
+    async def close(self):
+        """
+        Stop the job loop. Requests still waiting are cancelled.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+
+async def _handle_client(generator, reader, writer):
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                data = await generator.get(int(line))
+            except ValueError as error:
+                writer.write(f"ERROR {error}\n".encode())
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_service(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None, generator=None):
+    """
+    Start the service and return (server, generator). It listens on the Unix
+    socket `path` if one is given, otherwise on TCP host:port.
+    """
+    if generator is None:
+        generator = CoalescingGenerator()
+    handler = partial(_handle_client, generator)
+    if path is not None:
+        server = await asyncio.start_unix_server(handler, path=path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    return server, generator
+
+
+async def fetch_random_bytes(n, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+    """
+    Client helper: ask a running service for `n` random bytes.
+    """
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"{n}\n".encode())
+        await writer.drain()
+        return await reader.readexactly(n)
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def main():
+    server, generator = await start_service()
+    print(f"Quantum random byte service listening on {DEFAULT_HOST}:{DEFAULT_PORT}")
+    print("Send the number of bytes you want followed by a newline, e.g.:")
+    print(f"    printf '16\\n' | nc {DEFAULT_HOST} {DEFAULT_PORT} | xxd")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
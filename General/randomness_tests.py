@@ -0,0 +1,214 @@
+# Statistical tests and throughput benchmark for the quantum random bytes
+#
+# RandomnessTests accumulates a few counters per chunk of bytes, so the tests
+# run over outputs of any size in constant memory:
+#   - frequency (monobit): are there as many 1 bits as 0 bits?
+#   - runs: does the number of runs of equal bits match a random sequence?
+#   - byte chi-square: are the 256 byte values equally frequent?
+#   - serial correlation: is each byte independent of the previous one?
+#   - entropy: Shannon and min-entropy of the byte histogram (at most 8 bits/byte)
+# The first four give a p-value; a p-value below ~0.01 means the test failed.
+#
+# benchmark() measures the bytes/second of each generation strategy.
+
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+from scipy.special import gammaincc
+
+# number of 1 bits in each byte value
+_ONES = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1)
+
+# significance level used by TestResult.passed
+ALPHA = 0.01
+
+TestResult = namedtuple("TestResult", ["name", "statistic", "p_value", "passed"])
+
+
+class RandomnessTests:
+    """
+    Streaming test battery: call update() with every chunk of bytes (uint8
+    arrays or bytes), then results() for the test results and entropy().
+    """
+
+    def __init__(self):
+        self.bytes = 0
+        self._histogram = np.zeros(256, dtype=np.int64)
+        self._bit_changes = 0       # neighbouring bits that differ
+        self._first_byte = None
+        self._last_byte = None
+        self._sum_products = 0      # sum of byte[i] * byte[i+1]
+
+    def update(self, chunk):
+        """
+        Add the bytes of `chunk` to the counters.
+        """
+        if isinstance(chunk, (bytes, bytearray)):
+            chunk = np.frombuffer(chunk, dtype=np.uint8)
+        chunk = np.asarray(chunk, dtype=np.uint8)
+        if chunk.size == 0:
+            return
+        self._histogram += np.bincount(chunk, minlength=256)
+
+        # bits are read most significant first; count the neighbouring bits
+        # that differ inside each byte and between consecutive bytes
+        values = chunk.astype(np.int64)
+        self._bit_changes += int(_ONES[(chunk ^ (chunk >> 1)) & 0x7F].sum())
+        self._bit_changes += int(np.count_nonzero((chunk[:-1] & 1) != (chunk[1:] >> 7)))
+        self._sum_products += int(np.dot(values[:-1], values[1:]))
+
+        if self._last_byte is not None:
+            self._bit_changes += int((self._last_byte & 1) != (chunk[0] >> 7))
+            self._sum_products += self._last_byte * int(chunk[0])
+        else:
+            self._first_byte = int(chunk[0])
+        self._last_byte = int(chunk[-1])
+        self.bytes += chunk.size
+
+    def _bits(self):
+        n = 8 * self.bytes
+        ones = int(np.dot(self._histogram, _ONES))
+        return n, ones
+
+    def frequency(self):
+        n, ones = self._bits()
+        statistic = abs(2 * ones - n) / math.sqrt(n)
+        return _result("frequency", statistic, math.erfc(statistic / math.sqrt(2)))
+
+    def runs(self):
+        n, ones = self._bits()
+        share = ones / n
+        runs = self._bit_changes + 1
+        # NIST SP 800-22: the runs test is not applicable when the frequency is far off
+        if abs(share - 0.5) >= 2 / math.sqrt(n):
+            return _result("runs", float(runs), 0.0)
+        spread = 2 * math.sqrt(2 * n) * share * (1 - share)
+        return _result("runs", float(runs), math.erfc(abs(runs - 2 * n * share * (1 - share)) / spread))
+
+    def chi_square(self):
+        expected = self.bytes / 256
+        statistic = float(((self._histogram - expected) ** 2).sum() / expected)
+        return _result("byte chi-square", statistic, float(gammaincc(255 / 2, statistic / 2)))
+
+    def serial_correlation(self):
+        # correlation of each byte with the next one, wrapping around at the end
+        n = self.bytes
+        values = np.arange(256)
+        total = float(np.dot(self._histogram, values))
+        squares = float(np.dot(self._histogram, values**2))
+        products = self._sum_products + self._last_byte * self._first_byte
+        denominator = n * squares - total**2
+        correlation = (n * products - total**2) / denominator if denominator else 1.0
+        statistic = abs(correlation) * math.sqrt(n)
+        return _result("serial correlation", correlation, math.erfc(statistic / math.sqrt(2)))
+
+    def entropy(self):
+        """
+        Return (Shannon entropy, min-entropy) of the byte histogram in bits per byte.
+        """
+        probabilities = self._histogram[self._histogram > 0] / self.bytes
+        return float(-(probabilities * np.log2(probabilities)).sum()), float(-np.log2(probabilities.max()))
+
+    def results(self):
+        """
+        Return the TestResult of every test.
+        """
+        if self.bytes < 2:
+            raise ValueError("the tests need at least 2 bytes")
+        return [self.frequency(), self.runs(), self.chi_square(), self.serial_correlation()]
+
+
+def _result(name, statistic, p_value):
+    return TestResult(name, statistic, p_value, p_value >= ALPHA)
+
+
+def run_battery(chunks):
+    """
+    Run the test battery over an iterable of byte chunks (or a single array).
+    Returns the RandomnessTests object, see its results() and entropy().
+    """
+    tests = RandomnessTests()
+    if isinstance(chunks, (np.ndarray, bytes, bytearray)):
+        chunks = [chunks]
+    for chunk in chunks:
+        tests.update(chunk)
+    return tests
+
+
+def report(tests):
+    """
+    Print the results of a RandomnessTests object.
+    """
+    print(f"Randomness tests over {tests.bytes} bytes:")
+    for result in tests.results():
+        verdict = "pass" if result.passed else "FAIL"
+        print(f"  {result.name:<20} statistic = {result.statistic:12.4f}   p-value = {result.p_value:.4f}   {verdict}")
+    shannon, minimum = tests.entropy()
+    print(f"  entropy: {shannon:.4f} bits/byte (Shannon), {minimum:.4f} bits/byte (min-entropy), ideal 8")
+
+
+def benchmark(strategies, total_bytes):
+    """
+    Time every strategy, a dict {name: function(n) returning n random bytes},
+    generating `total_bytes` bytes (or {name: number of bytes}). Returns
+    {name: bytes per second}.
+    """
+    if not isinstance(total_bytes, dict):
+        total_bytes = dict.fromkeys(strategies, total_bytes)
+    rates = {}
+    for name, generate in strategies.items():
+        n = total_bytes[name]
+        start = time.perf_counter()
+        data = generate(n)
+        elapsed = time.perf_counter() - start
+        if len(data) != n:
+            raise ValueError(f"strategy {name!r} returned {len(data)} bytes instead of {n}")
+        rates[name] = n / elapsed
+    return rates
+
+
+if __name__ == "__main__":
+    from qrng import QuantumRandomStream, random_bytes, random_word_circuit
+    from qiskit import transpile
+    from qiskit_aer import AerSimulator
+
+    def one_job_per_byte(n):
+        # what Single Byte.py used to do: build, transpile and run a job for every byte
+        values = []
+        for _ in range(n):
+            simulator = AerSimulator()
+            circuit = transpile(random_word_circuit(8), simulator)
+            values.append(int(list(simulator.run(circuit, shots=1).result().get_counts())[0], 2))
+        return np.array(values, dtype=np.uint8)
+
+    def sustained_stream(n):
+        # a new stream read over 4 times its buffer, so the refills are timed
+        with QuantumRandomStream(buffer_size=n // 4) as stream:
+            return stream.read(n)
+
+    strategies = {
+        "one job per byte": one_job_per_byte,
+        "bulk, 8 qubits": lambda n: random_bytes(n, width=8),
+        "bulk, 32 qubits": lambda n: random_bytes(n, width=32),
+        "bulk, 64 qubits": lambda n: random_bytes(n, width=64),
+        "stream read()": sustained_stream,
+    }
+    sizes = dict.fromkeys(strategies, 1 << 20)
+    sizes["one job per byte"] = 200
+
+    print("Throughput:")
+    for name, rate in benchmark(strategies, sizes).items():
+        print(f"  {name:<20} {rate:14,.0f} bytes/s")
+
+    # reading from a full buffer only copies bytes: latency, not generation
+    with QuantumRandomStream(buffer_size=1 << 20) as stream:
+        # the first read waits for the first refill, the second is served from it
+        stream.read(4096)
+        start = time.perf_counter()
+        stream.read(4096)
+        print(f"Buffered read() of 4096 bytes from the buffer: {(time.perf_counter() - start) * 1e6:.0f} µs")
+    print()
+
+    report(run_battery(random_bytes(1 << 20) for _ in range(4)))